@@ -1,58 +1,33 @@
-import pandas as pd
+import os
+import numpy as np
 from datetime import datetime
-import copy
-from julia import Main
 from collections import Counter
+from timetable import MINUTES_PER_DAY, load_week
+if os.environ.get("K_POSITION_ENGINE", "julia") == "highs":
+    from highs_solver import optimize_model  # Solve with HiGHS in this process, no Julia needed
+else:
+    from julia_solver import optimize_model
+from julia_solver import SOLVED_STATUSES, log_stats
 from parking_busses import Lane, parking, dispatching, adjustDeparture
 
 
-# Load Julia script
-#Main.include("k_position_approach.jl")
-Main.include("k_position_approach_PELA.jl") # Load the correct Julia script
-
-class Bus:
-    def __init__(self, bus_id, bus_fuel, bus_type, bus_color):
-        self.bus_id = bus_id
-        self.bus_fuel = bus_fuel
-        self.bus_type = bus_type
-        self.bus_color = bus_color
-
-        self.arrival_time_MAKE = None # Saapumisaika alustetaan myöhemmin
-        self.departure_time_TITO = None # Säilytetään `time`-muodossa
-
-        self.arrival_time_TO = None # Saapumisaika alustetaan myöhemmin
-        self.departure_time_PE = None # Säilytetään `time`-muodossa
-
-        self.arrival_time_PE = None # Saapumisaika alustetaan myöhemmin
-        self.departure_time_LA = None # Säilytetään `time`-muodossa
-
-        self.arrival_time_LA = None # Saapumisaika alustetaan myöhemmin
-        self.departure_time_SU = None # Säilytetään `time`-muodossa
-
-        self.arrival_time_SU = None # Saapumisaika alustetaan myöhemmin
-        self.departure_time_MA = None # Säilytetään `time`-muodossa
-
-
-    def __repr__(self):
-        return (
-            f"Bus(\n"
-            f"  ID={self.bus_id},\n"
-            f"  Fuel={self.bus_fuel},\n"
-            f"  Type={self.bus_type},\n"
-            f"  Color={self.bus_color},\n\n"
-            f"  Arrival_MAKE={self.arrival_time_MAKE},\n"
-            f"  Departure_TITO={self.departure_time_TITO},\n\n"
-            f"  Arrival_TO={self.arrival_time_TO},\n"
-            f"  Departure_PE={self.departure_time_PE},\n\n"
-            f"  Arrival_PE={self.arrival_time_PE},\n"
-            f"  Departure_LA={self.departure_time_LA},\n\n"
-            f"  Arrival_LA={self.arrival_time_LA},\n"
-            f"  Departure_SU={self.departure_time_SU},\n\n"
-            f"  Arrival_SU={self.arrival_time_SU}\n"
-            f"  Departure_MA={self.departure_time_MA},\n"
-            f"  Data type of departure={type(self.departure_time_LA)})"
-        )
-        
+# Julia model and function, solved on the long-lived solver process (julia_solver.py)
+# or, with K_POSITION_ENGINE=highs, by the same model in highs_solver.py
+MODEL_FILE = "k_position_approach.jl"
+MODEL_FUNCTION = "optimize_model_k_approach"
+# Side constraints of the depot on this night, see DEPOT_LAYOUTS in the model file
+DEPOT_LAYOUT = "PELA"
+# Build Y and Z only at the positions where the arrival and departure constraints bind
+COMPRESS_POSITIONS = True
+# Leave out the patterns no lane can use with the bus counts of the night. Only checked with the
+# highs engine so far, the Julia model keeps every pattern until check_engines.py has been run on it
+PRUNE_PATTERNS = os.environ.get("K_POSITION_ENGINE", "julia") == "highs"
+# Start the solver from the last solution of the same depot configuration (e.g. the previous night)
+WARM_START = True
+# Return the best plan found after TIME_LIMIT seconds, a solve within MIP_GAP of the optimum counts as optimal
+TIME_LIMIT = 300
+MIP_GAP = 1e-4
+
 # Bussityyppien määrittely (alkuliitteet ilman XXX)
 BUS_TYPE_MAPPING = {
     "DMS": {"fuel": "Biodiesel", "type": "2-aks.", "color": "Super"},
@@ -65,288 +40,77 @@ BUS_TYPE_MAPPING = {
     #"DTV": {"fuel": "Biodiesel", "type": "Teli", "color": "Vihreä"}
 }
 
-def all_arrivals_departures(file_paths):
-    """Return all arrivals and departures from the bus list."""
+def all_arrivals_departures(file_paths, backend=None):
+    """Return all arrivals and departures from the bus list as a WeekTimetable."""
 
-    # Lataa Excel-tiedosto ja valitse vain Tunnus ja Lähtöaika
-    df = pd.read_excel(file_paths[0], sheet_name=0, usecols=["Tunnus", "Lähtöaika", "Saapumisaika"])
+    # Viikko luetaan välimuistista. Vain edellisen ajon jälkeen muuttuneet työkirjat luetaan uudelleen
+    # ja niistä tulevat sarakkeet päivitetään.
+    week = load_week(file_paths, BUS_TYPE_MAPPING.keys(), backend=backend)
 
-    # Poista tyhjät arvot ja siisti Tunnus-sarake
-    df = df.dropna(subset=["Tunnus", "Lähtöaika", "Saapumisaika"])  # Poista tyhjät rivit
-    df["Tunnus"] = df["Tunnus"].str.strip()  # Poista ylimääräiset välilyönnit
- 
-    # Convert "Lähtöaika" and "Saapumisaika" to hours as decimals
-    df["Lähtöaika"] = pd.to_datetime(df["Lähtöaika"], format="%H:%M:%S", errors="coerce").apply(
-        lambda x: x.hour + x.minute / 60 if pd.notnull(x) else None
-    )
-    df["Saapumisaika"] = pd.to_datetime(df["Saapumisaika"], format="%H:%M:%S", errors="coerce").apply(
-        lambda x: x.hour + x.minute / 60 if pd.notnull(x) else None
-    )
-    df = df.dropna(subset=["Lähtöaika", "Saapumisaika"])
+    print("Nro of buses:")
+    print(len(week))
 
-    valid_types = list(BUS_TYPE_MAPPING.keys())
+    return week
 
-    def contains_valid_prefix(bus_id):
-        return any(prefix in bus_id for prefix in valid_types)
+def adjust_none_arrivals(week):
+    """Adjust buses with None in arrival or departure times by adding 24 hours (MINUTES_PER_DAY)."""
+    week.fill_missing(MINUTES_PER_DAY)
 
-    df = df[df["Tunnus"].apply(contains_valid_prefix)]
-    
-    #Ryhmittele Tunnuksen mukaan ja ota pienin Lähtöaika ja suurin Saapumisaika
-    grouped = df.groupby("Tunnus").agg(
-        smallest_departure=("Lähtöaika", "min"),
-        largest_arrival=("Saapumisaika", "max")
-    ).reset_index()
-    # Luo bussit DataFramesta
-    busses = []
-    for _, row in grouped.iterrows():
-        bus_id = row["Tunnus"]
-        departure_time = row["smallest_departure"]
-        arrival_time = row["largest_arrival"]
-
-        # Selvitä bussityyppi tarkistamalla alkuliite
-        bus_type_key = next((key for key in BUS_TYPE_MAPPING.keys() if bus_id.startswith(key)), None)
-        bus_type_mapping = BUS_TYPE_MAPPING.get(bus_type_key)
-
-        bus_fuel = bus_type_mapping["fuel"]
-        bus_type = bus_type_mapping["type"]
-        bus_color = bus_type_mapping["color"]
-
-        # Luo bussi-olio
-        bus = Bus(bus_id, bus_fuel, bus_type, bus_color)
-        bus.arrival_time_MAKE = arrival_time
-        bus.departure_time_TITO = departure_time
-        bus.departure_time_MA = departure_time
-        busses.append(bus)
-
-    for i in range(len(file_paths)-1):
-        # Lataa Excel-tiedosto ja valitse vain Tunnus ja Lähtöaika
-        df = pd.read_excel(file_paths[i], sheet_name=0, usecols=["Tunnus", "Saapumisaika"])
-        df_2 = pd.read_excel(file_paths[i+1], sheet_name=0, usecols=["Tunnus", "Lähtöaika"])
-
-        valid_types = list(BUS_TYPE_MAPPING.keys())
-
-        def contains_valid_prefix(bus_id):
-            return any(prefix in bus_id for prefix in valid_types)
-
-        df = df[df["Tunnus"].apply(contains_valid_prefix)]
-        df_2 = df_2[df_2["Tunnus"].apply(contains_valid_prefix)]
-
-        # Merge the dataframes for "Tunnus", "Lähtöaika", and "Saapumisaika"
-        #df_combined = pd.merge(
-        #    df,
-        #    df_2,
-        #    on="Tunnus",
-        #    how="inner"
-        #)
-        #df_combined = df_combined.dropna(subset=["Tunnus", "Lähtöaika", "Saapumisaika"])  # Poista tyhjät rivit
-        #df_combined["Tunnus"] = df_combined["Tunnus"].str.strip()  # Poista ylimääräiset välilyönnit
-        df["Tunnus"] = df["Tunnus"].str.strip()  # Poista ylimääräiset välilyönnit
-        df_2["Tunnus"] = df_2["Tunnus"].str.strip()  # Poista ylimääräiset välilyönnit
 
-    
-        df["Saapumisaika"] = pd.to_datetime(df["Saapumisaika"], format="%H:%M:%S", errors="coerce").apply(
-            lambda x: x.hour + x.minute / 60 if pd.notnull(x) else None
-        )
-        df_2["Lähtöaika"] = pd.to_datetime(df_2["Lähtöaika"], format="%H:%M:%S", errors="coerce").apply(
-            lambda x: x.hour + x.minute / 60 if pd.notnull(x) else None
-        )
-        
-        
-        # Group by "Tunnus" and get the smallest "Lähtöaika" and largest "Saapumisaika"
-        df = df.groupby("Tunnus").agg(
-            largest_arrival=("Saapumisaika", "max")
-        ).reset_index()
-
-        df_2 = df_2.groupby("Tunnus").agg(
-            smallest_departure=("Lähtöaika", "min")
-        ).reset_index()
-
-        # Update the bus objects with the new arrival and departure times
-        for _, row in df.iterrows():
-            bus_id = row["Tunnus"]
-            arrival_time = row["largest_arrival"]
-
-            bus_ids = [b.bus_id for b in busses]
-            if bus_id not in bus_ids:
-                # If the bus_id is not in the list, create a new bus object
-                bus = Bus(bus_id, BUS_TYPE_MAPPING[bus_id[:3]]["fuel"], BUS_TYPE_MAPPING[bus_id[:3]]["type"], BUS_TYPE_MAPPING[bus_id[:3]]["color"])
-                busses.append(bus)
-            # Find the corresponding bus object
-            bus = next((b for b in busses if b.bus_id == bus_id), None)
-            if bus:
-                # Update the appropriate departure and arrival times
-                if i == 0:
-                    bus.arrival_time_TO = arrival_time
-                elif i == 1:
-                    bus.arrival_time_PE = arrival_time
-                elif i == 2:
-                    bus.arrival_time_LA = arrival_time
-                elif i == 3:
-                    bus.arrival_time_SU = arrival_time
-
-
-        for _, row in df_2.iterrows():
-            bus_id = row["Tunnus"]
-            departure_time = row["smallest_departure"]
-
-            bus_ids = [b.bus_id for b in busses]
-            if bus_id not in bus_ids:
-                # If the bus_id is not in the list, create a new bus object
-                bus = Bus(bus_id, BUS_TYPE_MAPPING[bus_id[:3]]["fuel"], BUS_TYPE_MAPPING[bus_id[:3]]["type"], BUS_TYPE_MAPPING[bus_id[:3]]["color"])
-                busses.append(bus)
-
-            # Find the corresponding bus object 
-            bus = next((b for b in busses if b.bus_id == bus_id), None)
-            if bus:
-                # Update the appropriate departure and arrival times
-                if i == 4:
-                    bus.departure_time_TITO = departure_time
-                elif i == 0:
-                    bus.departure_time_PE = departure_time
-                elif i == 1:
-                    bus.departure_time_LA = departure_time
-                elif i == 2:
-                    bus.departure_time_SU = departure_time
-
-
-    # Print the bus objects for debugging
-    #for bus in busses:
-    #    print(bus)
-    #for bus in busses:
-    #    if bus.bus_id == "SVV703":
-    #        print(bus)  
+def night_instance(week):
+    """
+    Night to solve from the week timetable (PE night: arrivals on PE, departures on LA).
 
-    print("Nro of buses:")
-    print(len(busses))
-
-    return busses
-
-def adjust_none_arrivals(busses):
-    """Adjust buses with None in arrival or departure times by adding 24 hours."""
-    count = 0
-    for bus in busses:
-        if bus.arrival_time_MAKE is None:
-            bus.arrival_time_MAKE = 24.0  
-        if bus.departure_time_TITO is None:
-            bus.departure_time_TITO = 24.0
-        if bus.arrival_time_TO is None:
-            bus.arrival_time_TO = 24.0
-        if bus.departure_time_PE is None:
-            bus.departure_time_PE = 24.0
-        if bus.arrival_time_PE is None:
-            bus.arrival_time_PE = 24.0
-        if bus.departure_time_LA is None:
-            bus.departure_time_LA = 24.0
-        if bus.arrival_time_LA is None:
-            bus.arrival_time_LA = 24.0
-        if bus.departure_time_SU is None:
-            bus.departure_time_SU = 24.0
-        if bus.arrival_time_SU is None:
-            bus.arrival_time_SU = 24.0
-        if bus.departure_time_MA is None:
-            bus.departure_time_MA = 24.0
-
-
-if __name__ == "__main__":
-    file_path1 = "data/KAJSYK24_MA-TO.xlsx"
-    file_path2 = "data/KAJSYK24_PE.xlsx"
-    file_path3 = "data/KAJSYK24_LA.xlsx"
-    file_path4 = "data/KAJSYK24_SU.xlsx"
-    file_path5 = "data/KAJSYK24_MA-TO.xlsx"
-    file_paths = [file_path1, file_path2, file_path3, file_path4, file_path5]
-    print(file_paths)
-    busses = all_arrivals_departures(file_paths)
-    #print(busses)
+    Args:
+        week (WeekTimetable): Timetable of the week, modified in place.
 
+    Returns:
+        tuple: Bus ids in arrival order, their type codes (see WeekTimetable.types), bus ids in
+            departure order and their type codes.
+    """
     # Convert "SVV" buses to "SMV" type
-    koulubussit = [] # Näitä ei ole mallissa mukana ollenkaan, tulee tehdä käsin ja parkkeerata ulos
-    count = 0
-    for bus in busses:
-        if bus.bus_id[:3] == "SVV":
-            bus.bus_id = bus.bus_id.replace("SVV", "SMV", 1)
-            bus.bus_fuel = BUS_TYPE_MAPPING["SMV"]["fuel"]
-            bus.bus_type = BUS_TYPE_MAPPING["SMV"]["type"]
-            bus.bus_color = BUS_TYPE_MAPPING["SMV"]["color"]
-
-        elif bus.bus_id[:6] in ["DMV426", "DMV427", "DMV428", "DMV429"]:
-            koulubussit.append(bus)
-            busses.remove(bus)
-            count += 1
+    week.rename_type("SVV", "SMV")
+
+    # Näitä ei ole mallissa mukana ollenkaan, tulee tehdä käsin ja parkkeerata ulos
+    school_busses = week.starts_with(["DMV426", "DMV427", "DMV428", "DMV429"])
+    koulubussit = week.select(school_busses)
+    count = len(koulubussit)
+    week = week.select(~school_busses)
 
     # Adjust None arrival times
-    #adjust_none_arrivals(busses)
+    #adjust_none_arrivals(week)
 
     # PITÄÄ LISÄTÄ None aikoihin +24.00 per None arrival
-    busses = adjustDeparture(busses, "pe")
-    #for bus in adjusted_departure_times:
-    #    print(bus.__repr__)
-    for bus in busses:
-        if bus.bus_id in ["DMV426", "DMV427", "DMV428", "DMV429"]:
-            busses.remove(bus)
-            #print(bus)
-            count += 1
+    week = adjustDeparture(week, "pe")
     print("Number of busses removed: ", count)
 
     # Remove buses with None values in any of the arrival or departure times
-    busses_arrivals_PE = []
-    for bus in busses:
-        if bus.arrival_time_PE is not None:
-            busses_arrivals_PE.append(bus)
-        else:
-            print(f"Removed bus: {bus} having no arrival time on Friday")
-
-    busses_departures_LA = []
-    for bus in busses:
-        if bus.departure_time_LA is not None:
-            busses_departures_LA.append(bus)
-        else:
-            print(f"Removed bus: {bus} having no departure time on Saturday")
-
-    # Find the SMV or STS buses that are parked behind the DMS or DMV buses (H, I, J columns). 
-    #arrival_ids_PE = []
-    #for bus in busses_arrivals_PE:
-    #    arrival_ids_PE.append(bus.bus_id)
-
-    #departures_to_remove = [bus for bus in busses_departures_LA if bus.bus_id not in arrival_ids_PE][:1]
-    #for bus in departures_to_remove:
-    #    print(f"Bus to remove: {bus}")
-    #    busses_departures_LA.remove(bus)
+    rows_arrivals_PE = np.flatnonzero(week.has_times("arrival_time_PE"))
+    for row in np.flatnonzero(~week.has_times("arrival_time_PE")):
+        print(f"Removed bus: {week.describe(row)} having no arrival time on Friday")
+
+    rows_departures_LA = np.flatnonzero(week.has_times("departure_time_LA"))
+    for row in np.flatnonzero(~week.has_times("departure_time_LA")):
+        print(f"Removed bus: {week.describe(row)} having no departure time on Saturday")
 
     # Lauantaita varten sarakkeisiin H, I, J parkkeeratut diesel bussit asetetaan lähtemään keinotekoisesti todella aikaisin.
     # Tämä mahdollistaa niiden perään parkkeerattujen sähköbussien liikennöinnin viikonloppuna.
     # Fyysisesti nämä siis ajetaan ulos hallista aamulla ja ajetaan takaisin SAMOILLE paikoille, kun halli on tyhjentynyt.
     # DMV401, DMV402, DMV403, DMV404, DMV405, DMV406, DMS101
-    count = 1
-    dmv_busses = []
-    for bus in busses_departures_LA:
-        if bus.bus_id[:6] in ["DMV401", "DMV402", "DMV403", "DMV404", "DMV405", "DMV406", "DMV407"]:
-            dmv_busses.append(bus)
-    dmv_busses = sorted(dmv_busses, key=lambda x: x.departure_time_MA)
-
-    for bus in busses_departures_LA:
-        if bus.bus_id[:6] in ["DMV401", "DMV402", "DMV403", "DMV404", "DMV405", "DMV406", "DMV407"]:
-            bus.departure_time_LA = (dmv_busses.index(bus) + 1) * 0.01
-            print(bus)
-
-    #print("busses_arrivals_TO")
-    #print(busses_arrivals_PE)
-    #print("busses_departures_PE")
-    #print(busses_departures_LA)
-        
-    arrivals_PE = copy.copy(sorted(busses_arrivals_PE, key=lambda x: x.arrival_time_PE))
-    departures_LA = copy.copy(sorted(busses_departures_LA, key=lambda x: x.departure_time_LA))
-
-    arrivals_list_TO = []
-    for_parking = []
-    for bus in arrivals_PE:
-        for_parking.append(bus.bus_id)
-        arrivals_list_TO.append(bus.bus_id[:3])
-    
-    departures_list_PE = []
-    for_dispatching = []
-    for bus in departures_LA:
-        for_dispatching.append(bus.bus_id)
-        departures_list_PE.append(bus.bus_id[:3])
+    dmv_busses = rows_departures_LA[week.starts_with(["DMV401", "DMV402", "DMV403", "DMV404", "DMV405", "DMV406", "DMV407"], rows_departures_LA)]
+    dmv_busses = week.order("departure_time_MA", dmv_busses)
+    week.set_times(dmv_busses, "departure_time_LA", np.arange(len(dmv_busses)) - len(dmv_busses)) # Negatiivinen = ennen vuorokauden alkua
+    for row in dmv_busses:
+        print(week.describe(row))
+
+    arrivals_PE = week.order("arrival_time_PE", rows_arrivals_PE)
+    departures_LA = week.order("departure_time_LA", rows_departures_LA)
+
+    for_parking = week.bus_ids[arrivals_PE].tolist()
+    arrivals_list_TO = week.type_codes[arrivals_PE]
+
+    for_dispatching = week.bus_ids[departures_LA].tolist()
+    departures_list_PE = week.type_codes[departures_LA]
 
     print(f"\nArrivals: {len(arrivals_list_TO)}")
     print(f"\nDepartures: {len(departures_list_PE)}")
@@ -357,12 +121,30 @@ if __name__ == "__main__":
     #print("Nro of busess in departures_list_TITO:")
     #print(len(departures_list_PE))
 
+    return for_parking, arrivals_list_TO, for_dispatching, departures_list_PE
+
+
+if __name__ == "__main__":
+    file_path1 = "data/KAJSYK24_MA-TO.xlsx"
+    file_path2 = "data/KAJSYK24_PE.xlsx"
+    file_path3 = "data/KAJSYK24_LA.xlsx"
+    file_path4 = "data/KAJSYK24_SU.xlsx"
+    file_path5 = "data/KAJSYK24_MA-TO.xlsx"
+    file_paths = [file_path1, file_path2, file_path3, file_path4, file_path5]
+    print(file_paths)
+    week = all_arrivals_departures(file_paths)
+
+    for_parking, arrivals_list_TO, for_dispatching, departures_list_PE = night_instance(week)
+
     l = 12  # Number of lanes
     v = 6  # Total number of bus slots
     max_deviation = 5
 
     
-    X, Y, Z , P = Main.optimize_model_k_approach_PELA(l, v, max_deviation, arrivals_list_TO, departures_list_PE)
+    X, Y, Z, P, status, stats = optimize_model(MODEL_FILE, MODEL_FUNCTION, l, v, max_deviation, arrivals_list_TO, departures_list_PE, layout=DEPOT_LAYOUT, compress_positions=COMPRESS_POSITIONS, prune_patterns=PRUNE_PATTERNS, time_limit=TIME_LIMIT, mip_gap=MIP_GAP, types=week.types, warm_start=WARM_START)
+    log_stats(stats, night="pe", l=l, v=v, layout=DEPOT_LAYOUT, status=status)
+    if status not in SOLVED_STATUSES:
+        raise SystemExit(f"No plan to park, the solver stopped with status {status}")
 
 
     lanes_list = []
@@ -370,10 +152,10 @@ if __name__ == "__main__":
         if X[i] > 0.99:
             for j in range(round(X[i])):
                 print(f"Pattern {i+1}: {round(X[i])} instances of, {pat} pattern")
-                obj = Lane(pat, i)
+                obj = Lane(pat, i, week.types)
                 lanes_list.append(obj)
 
 
-    buses_mapped, lanes_parking = parking(lanes_list, for_parking, Y, P)
-    lanes_dispatching = dispatching(lanes_list, buses_mapped, for_dispatching, Z, P)
+    buses_mapped, lanes_parking = parking(lanes_list, for_parking, Y, P, arrivals_list_TO)
+    lanes_dispatching = dispatching(lanes_list, buses_mapped, for_dispatching, Z, P, departures_list_PE)
     
\ No newline at end of file
@@ -0,0 +1,20 @@
+# Builds a custom Julia sysimage with JuMP, HiGHS and JSON precompiled, including the methods the
+# k-position model calls while building, solving and reading back a night (the workload in
+# precompile_k_position.jl), so that a cold solver process spends less of its first solve compiling.
+# The model file itself is not in the image: solver_server.jl includes it into a fresh module at
+# start-up, so its own functions are still compiled on the first solve.
+#
+# Usage: julia --project=. build_sysimage.jl            (or: python julia_solver.py build)
+#
+# The result, k_position_sysimage.so (.dylib on macOS, .dll on Windows), is used by
+# julia_solver.py automatically when it exists. Rebuild it after updating JuMP or HiGHS in Project.toml.
+
+using PackageCompiler
+
+ext = Sys.iswindows() ? "dll" : Sys.isapple() ? "dylib" : "so"
+
+create_sysimage(
+    [:JuMP, :HiGHS, :JSON];
+    sysimage_path=joinpath(@__DIR__, "k_position_sysimage.$ext"),
+    precompile_execution_file=joinpath(@__DIR__, "precompile_k_position.jl"),
+)
@@ -0,0 +1,130 @@
+import copy
+import sys
+
+import numpy as np
+
+import highs_solver
+import julia_solver
+import MAKE
+import plan_week
+from timetable import load_week
+
+
+# Solve the real nights with every engine and model variant and check that they agree: the Julia
+# model with (6)-(13) added row by row (the baseline) and in matrix form (matrix_constraints), and
+# highs_solver.py, each with all patterns and with prune_patterns. Run it before switching a default
+# and after changing the model.
+# Usage: python check_engines.py [make to pe la]   (needs Julia, see julia_solver.py)
+
+NIGHTS = ["make", "to", "pe", "la"]
+# Known results of the KAJSYK24 nights: status and number of two-block lanes
+EXPECTED = {"to": ("OPTIMAL", 8), "pe": ("OPTIMAL", 8), "la": ("INFEASIBLE", None)}
+
+
+def julia_variant(**options):
+    """Solve on the Julia solver process with the given model options."""
+    def solve(l, v, max_deviation, arrivals, departures, **common):
+        return julia_solver.optimize_model(MAKE.MODEL_FILE, MAKE.MODEL_FUNCTION, l, v, max_deviation,
+                                           arrivals, departures, **common, **options)
+    return solve
+
+
+def highs_variant(**options):
+    """Solve with highs_solver.py in this process with the given model options."""
+    def solve(*args, **common):
+        return highs_solver.optimize_model_k_approach(*args, **common, **options)
+    return solve
+
+
+# Variant name: solve function. The first one is the reference, the row counts are only compared
+# between variants with the same patterns (pruned or not).
+VARIANTS = {
+    "julia loops": julia_variant(matrix_constraints=False),
+    "julia matrix": julia_variant(matrix_constraints=True),
+    "highs": highs_variant(),
+    "julia loops pruned": julia_variant(matrix_constraints=False, prune_patterns=True),
+    "julia matrix pruned": julia_variant(matrix_constraints=True, prune_patterns=True),
+    "highs pruned": highs_variant(prune_patterns=True),
+}
+
+
+def night_instances(nights):
+    """Arrival and departure type codes of each night, built like plan_week does."""
+    week = load_week(plan_week.FILE_PATHS, MAKE.BUS_TYPE_MAPPING.keys())
+    instances = {}
+    for night in nights:
+        for_parking, arrivals, for_dispatching, departures = plan_week.NIGHT_SETTINGS[night][0](copy.deepcopy(week))
+        instances[night] = (arrivals, departures)
+    return week.types, instances
+
+
+def two_block_lanes(X, P):
+    """Objective of a solution, the number of lanes with a two-block pattern."""
+    return int(sum(x for x, pattern in zip(X, P) if len(pattern) == 2)) if len(X) else None
+
+
+def outside_patterns(arrivals, types, layout):
+    """The outside spot patterns of a night by content, picked from all patterns like the models do."""
+    bus_types = [types[code] for code in dict.fromkeys(np.asarray(arrivals).tolist())]
+    P = highs_solver.generate_patterns(plan_week.v, bus_types, layout["single_spot_types"])
+    return [P[len(P) - 1 - offset] for offset in layout["outside_spot_offsets"]]
+
+
+def check_night(night, arrivals, departures, types, variants=VARIANTS, compress_positions=True):
+    """
+    Solve one night with every variant and compare the status, the objective and the number of rows
+    of each constraint family with the first variant (and with EXPECTED). Every variant must also
+    keep the outside spot patterns and put the outside lanes on them, and the Julia variants must
+    report improved solutions while solving.
+
+    Returns:
+        list: Differences found, empty if the variants agree.
+    """
+    layout = highs_solver.DEPOT_LAYOUTS[plan_week.NIGHT_SETTINGS[night][1]]
+    outside = outside_patterns(arrivals, types, layout)
+    results = {}
+    differences = []
+    for name, solve in variants.items():
+        X, Y, Z, P, status, stats = solve(
+            plan_week.l, plan_week.v, plan_week.max_deviation, arrivals, departures,
+            layout=plan_week.NIGHT_SETTINGS[night][1], compress_positions=compress_positions,
+            time_limit=MAKE.TIME_LIMIT, mip_gap=MAKE.MIP_GAP, types=types,
+        )
+        results[name] = (status, two_block_lanes(X, P), (stats["patterns"], stats["constraints"]))
+        print(f"{night} {name}: {status}, objective {results[name][1]}, {stats['patterns']} patterns, "
+              f"build {stats['build_time']:.2f} s, solve {stats['solve_time']:.2f} s, rows {stats['constraints']}")
+
+        # Improved solutions must reach SolverClient.request while solving, see incumbent_callback
+        if status in julia_solver.SOLVED_STATUSES and stats.get("incumbents") == 0:
+            differences.append(f"{night}: no incumbents of {name} reached julia_solver.SolverClient")
+
+        P = [[tuple(block) for block in pattern] for pattern in P]
+        missing = [pattern for pattern in outside if pattern not in P]
+        if missing:
+            differences.append(f"{night}: {name} left out the outside spot patterns {missing}")
+        elif len(X) and sum(X[P.index(pattern)] for pattern in outside) != layout["outside_spots"]:
+            differences.append(f"{night}: {name} does not put {layout['outside_spots']} lanes on the outside spots")
+
+    reference_name, reference = next(iter(results.items()))
+    for name, result in results.items():
+        compared = result if result[2][0] == reference[2][0] else result[:2]
+        for field, value, expected in zip(("status", "objective", "rows"), compared, reference):
+            if value != expected:
+                differences.append(f"{night}: {field} of {name} is {value}, {reference_name} has {expected}")
+    if night in EXPECTED and reference[:2] != EXPECTED[night]:
+        differences.append(f"{night}: expected {EXPECTED[night]}, {reference_name} has {reference[:2]}")
+    return differences
+
+
+if __name__ == "__main__":
+    nights = sys.argv[1:] or NIGHTS
+    types, instances = night_instances(nights)
+    differences = []
+    for night, (arrivals, departures) in instances.items():
+        for compress_positions in (False, True):
+            print(f"\n------------\nNight {night}, compress_positions={compress_positions}")
+            differences += check_night(night, arrivals, departures, types, compress_positions=compress_positions)
+
+    print()
+    print("\n".join(differences) or "All variants agree")
+    sys.exit(1 if differences else 0)
@@ -0,0 +1,480 @@
+import sys
+import time
+from collections import Counter
+
+import highspy
+import numpy as np
+from scipy import sparse
+
+from julia_solver import SOLVED_STATUSES, load_solution, report_incumbent, save_solution
+
+
+# The k-position model of k_position_approach.jl built directly as a sparse matrix and solved
+# with HiGHS from Python, for running without Julia. Positions are 0-based here.
+
+ANY_SIZE = range(1, sys.maxsize)
+DIESEL = ("DMV", "DMS")
+ELECTRIC = ("SMV", "SMS")
+SMALL = ("STS", "STV")
+
+# Side constraints as (name, lanes, pattern rules). A pattern rule is (exit rule, entry rule),
+# a block rule is (bus types, block sizes) and an entry rule None matches any entry block (or none).
+# Same rules as DEPOT_LAYOUTS in k_position_approach.jl.
+LANES_GKL = ("G, K and L", 3, [((DIESEL, ANY_SIZE), (DIESEL, ANY_SIZE)), ((DIESEL, range(6, 7)), None)])
+LANES_BCDEF = ("B, C, D, E and F", 5, [((ELECTRIC, ANY_SIZE), (SMALL, range(1, 2)))])
+
+MATO_LAYOUT = {
+    "extra_lanes": 17 + 3,
+    "single_spot_types": SMALL + DIESEL,
+    "outside_spots": 17,
+    "outside_spot_offsets": range(2, 5),  # Patterns len(P) - 4 ... len(P) - 2 of all patterns, before pruning
+    "side_constraints": [
+        ("H", 1, [((DIESEL, range(1, 2)), (("SMV",), ANY_SIZE))]),
+        ("I", 1, [((DIESEL, range(1, 2)), (("SMS",), ANY_SIZE))]),
+        ("J", 1, [((DIESEL, range(5, 6)), (ELECTRIC, ANY_SIZE))]),
+        LANES_GKL,
+        LANES_BCDEF,
+    ],
+}
+
+LASU_LAYOUT = dict(MATO_LAYOUT, side_constraints=[
+    ("H, I and J", 3, [((DIESEL, ANY_SIZE), (ELECTRIC, ANY_SIZE))]),
+    LANES_GKL,
+    LANES_BCDEF,
+])
+
+# Layout of each night, PE shares the rules of MA-TO
+DEPOT_LAYOUTS = {"MATO": MATO_LAYOUT, "PELA": MATO_LAYOUT, "LASU": LASU_LAYOUT}
+
+
+def generate_patterns(v, bus_types, single_spot_types, counts=None, keep=()):
+    """
+    All admissible lane patterns in the order of generate_patterns in k_position_approach.jl.
+
+    Args:
+        v (int): Length of the lanes.
+        bus_types (list): Arriving bus types.
+        single_spot_types (list): Bus types with a one-block pattern of size 1.
+        counts (dict): Buses of each bus type. If given, patterns with a block larger than the number
+            of buses of its type are left out, constraint (5) keeps them at 0 lanes anyway.
+        keep (list): Patterns never left out, the outside spots. Patterns of types that do not arrive
+            are always kept.
+
+    Returns:
+        list: Patterns as lists of (bus_type, block_size) tuples, one block or exit and entry block.
+    """
+    P = [[(t, v)] for t in bus_types]
+    P += [[(t1, s1), (t2, v - s1)] for t1 in bus_types for t2 in bus_types if t1 != t2 for s1 in range(1, v)]
+    P += [[(t, 1)] for t in single_spot_types]
+    if counts is not None:
+        P = [pattern for pattern in P
+             if pattern in keep or all(t not in counts or s <= counts[t] for t, s in pattern)]
+    return P
+
+
+def block_sizes(P, bus_types):
+    """
+    Exit and entry block sizes of the patterns as dense (|P| x |bus_types|) arrays, zero where the
+    pattern has no block of that type. Single spot types that do not arrive get no exit block.
+    """
+    type_row = {t: k for k, t in enumerate(bus_types)}
+    exit_size = np.zeros((len(P), len(bus_types)), dtype=np.int64)
+    entry_size = np.zeros((len(P), len(bus_types)), dtype=np.int64)
+    for p, pattern in enumerate(P):
+        if pattern[0][0] in type_row:
+            exit_size[p, type_row[pattern[0][0]]] = pattern[0][1]
+        if len(pattern) == 2:
+            entry_size[p, type_row[pattern[1][0]]] = pattern[1][1]
+    return exit_size, entry_size
+
+
+def block_matches(sizes, bus_types, rule):
+    """sizes is a row of exit_size or entry_size, see block_sizes."""
+    types, allowed = rule
+    return any(int(sizes[k]) in allowed for k, t in enumerate(bus_types) if t in types)
+
+
+def pattern_matches(exit_sizes, entry_sizes, bus_types, rule):
+    exit_rule, entry_rule = rule
+    return block_matches(exit_sizes, bus_types, exit_rule) and (
+        entry_rule is None or block_matches(entry_sizes, bus_types, entry_rule))
+
+
+def cumulative_counts(rows, num_types):
+    """
+    (|types| x n) matrix of the number of buses of each type row among the first i + 1 of rows,
+    row -1 is a type that does not arrive.
+    """
+    rows = np.asarray(rows)
+    counts = np.zeros((num_types, len(rows)), dtype=np.int64)
+    positions = np.flatnonzero(rows >= 0)  # Departures may include types that do not arrive
+    counts[rows[positions], positions] = 1
+    return counts.cumsum(axis=1)
+
+
+def compute_max_min_arrivals(arrival_rows, num_types, max_deviation):
+    """
+    Bounds on the number of buses of each type arrived by each position, when every bus may arrive
+    up to max_deviation positions earlier (a_high) or later (a_low) than planned.
+
+    Returns:
+        tuple: a_high and a_low, both (|types| x n).
+    """
+    counts = cumulative_counts(arrival_rows, num_types)
+    n = counts.shape[1]
+    position = np.arange(1, n + 1)
+    a_high = np.minimum(counts[:, np.minimum(position + max_deviation, n) - 1], position)
+    earlier = np.where(position > max_deviation, counts[:, np.maximum(position - max_deviation, 1) - 1], 0)
+    a_low = np.maximum(earlier, counts[:, -1:] - (n - position))
+    return a_high, a_low
+
+
+def count_indices(counts):
+    """Positions where the count of each type goes up, as a list of arrays in the row order."""
+    return [np.flatnonzero(np.diff(row, prepend=0) > 0) for row in counts]
+
+
+def family_matrix(positions, coefficient, cols, num_col):
+    """
+    Rows of constraint (6), (7), (10) or (11) in matrix form, one row per type k and position i in
+    positions[k], in that order.
+
+    Args:
+        positions (list): Positions of the rows of each type row.
+        coefficient (np.ndarray): (columns x types) coefficients, e.g. exit_size.
+        cols (np.ndarray): Variable column of each coefficient row at each position.
+        num_col (int): Columns of the model.
+
+    Returns:
+        scipy.sparse.csr_matrix: coefficient[c, k] on column cols[c, i] in the row of (k, i) for every c
+            with a nonzero coefficient.
+    """
+    rows, columns, values = [], [], []
+    num_rows = 0
+    for k, I in enumerate(positions):
+        nonzero = np.flatnonzero(coefficient[:, k])
+        rows.append(np.repeat(num_rows + np.arange(len(I)), len(nonzero)))
+        columns.append(cols[np.ix_(nonzero, I)].T.ravel())
+        values.append(np.tile(coefficient[nonzero, k], len(I)))
+        num_rows += len(I)
+    return sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                             shape=(num_rows, num_col))
+
+
+def undominated_positions(positions, bound, total):
+    """
+    Positions of the rows of (7) or (11) that are not implied by the others. Y and Z only grow with
+    the position and the bounds never decrease, so a row is implied by the last row of its run of
+    equal bounds, and a bound of at least the total of the type holds by (5) with (9) or (13) already.
+    """
+    kept = []
+    for k, I in enumerate(positions):
+        I = np.sort(I)
+        values = bound[k, I]
+        last_of_run = np.append(np.diff(values) > 0, True)[:len(I)]
+        kept.append(I[last_of_run & (values < total[k])])
+    return kept
+
+
+def family_bounds(positions, bound):
+    """Right-hand side of a family in the row order of family_matrix."""
+    return np.concatenate([bound[k, I] for k, I in enumerate(positions)])
+
+
+def difference_matrix(left, right, num_col):
+    """Rows x[left[j]] - x[right[j]], for constraints x[left] <= x[right] in matrix form."""
+    m = len(left)
+    return sparse.csr_matrix((np.tile([1, -1], m), (np.repeat(np.arange(m), 2), np.column_stack([left, right]).ravel())),
+                             shape=(m, num_col))
+
+
+def optimize_model_k_approach(l, v, max_deviation, arrivals, departures, layout="MATO",
+                              compress_positions=False, start=None, time_limit=None, mip_gap=None, types=None,
+                              prune_patterns=False):
+    """
+    Build and solve the k-position model with HiGHS.
+
+    Args:
+        l, v, max_deviation, arrivals, departures: As for optimize_model_k_approach in Julia.
+        layout (str or dict): Key of DEPOT_LAYOUTS or a layout dict.
+        compress_positions (bool): Y and Z variables only at the event positions of each pattern.
+        start (dict): Earlier solution with X, Y, Z and P used as the starting point.
+        time_limit (float): Seconds to solve before returning the best plan found.
+        mip_gap (float): Relative gap at which the solve counts as optimal.
+        types (list): Bus type of each code (e.g. WeekTimetable.types) when arrivals and departures
+            are 0-based type codes, None when they are type names.
+        prune_patterns (bool): Leave out the patterns no lane can use with the bus counts of the night.
+
+    Returns:
+        tuple: X (integer array over P), Y and Z ((|P2| x n) int16 arrays, rows in the order of the two-block
+            patterns in P), P, the status flag and the statistics dict as in the Julia model.
+            X, Y, Z are empty unless the status is in SOLVED_STATUSES.
+    """
+    build_start = time.time()
+    layout = DEPOT_LAYOUTS[layout] if isinstance(layout, str) else layout
+
+    # Arrivals and departures as codes into types, names are only looked up once here
+    if types is None:
+        types = list(dict.fromkeys(list(arrivals) + list(departures)))
+        code = {t: k for k, t in enumerate(types)}
+        arrivals = np.array([code[t] for t in arrivals], dtype=np.int64)
+        departures = np.array([code[t] for t in departures], dtype=np.int64)
+    else:
+        arrivals = np.asarray(arrivals, dtype=np.int64)
+        departures = np.asarray(departures, dtype=np.int64)
+
+    # Type rows in the order of first arrival, -1 for types that do not arrive
+    arriving = np.array(list(dict.fromkeys(arrivals.tolist())), dtype=np.int64)
+    bus_types = [types[code] for code in arriving]
+    row = np.full(len(types), -1)
+    row[arriving] = np.arange(len(arriving))
+    arrival_rows = row[arrivals]
+    departure_rows = row[departures]
+
+    b = np.bincount(arrival_rows, minlength=len(bus_types))
+    n = len(arrivals)
+    print(f"Number of lanes: {l}")
+    print(f"Length of lanes: {v}")
+    print(f"Bus counts: {dict(zip(bus_types, b.tolist()))}")
+    print(f"The number of buses is {n}.")
+
+    a_high, a_low = compute_max_min_arrivals(arrival_rows, len(bus_types), max_deviation)
+    indices_high = count_indices(a_high)
+    indices_low = count_indices(a_low)
+    no_of_departed = cumulative_counts(departure_rows, len(bus_types))
+    departure_indices = count_indices(no_of_departed)
+
+    P = generate_patterns(v, bus_types, layout["single_spot_types"])
+
+    # Outside spot patterns by content, outside_spot_offsets counts them from the end of all patterns
+    outside = [P[len(P) - 1 - offset] for offset in layout["outside_spot_offsets"]]
+    if prune_patterns:
+        all_patterns = len(P)
+        P = generate_patterns(v, bus_types, layout["single_spot_types"], dict(zip(bus_types, b)), keep=outside)
+        print(f"Dominated patterns left out: {all_patterns - len(P)} of {all_patterns}")
+    P2 = [p for p in range(len(P)) if len(P[p]) == 2]
+    exit_size, entry_size = block_sizes(P, bus_types)
+
+    # Columns: X for every pattern, then Y and Z for the two-block patterns at their positions
+    everywhere = np.arange(n)
+    I_Y, I_Z = [], []
+    for p in P2:
+        t1, t2 = exit_size[p].argmax(), entry_size[p].argmax()  # Exit and entry type rows
+        if compress_positions:
+            others = [k for k in range(len(bus_types)) if k != t1]
+            I_Y.append(np.unique(np.concatenate([indices_high[t2]] + [indices_low[k] for k in others])))
+            I_Z.append(np.unique(np.concatenate([departure_indices[k] for k in others])))
+        else:
+            I_Y.append(everywhere)
+            I_Z.append(everywhere)
+
+    num_col = len(P)
+    y_col = np.full((len(P2), n), -1)
+    z_col = np.full((len(P2), n), -1)
+    for cols, positions in ((y_col, I_Y), (z_col, I_Z)):
+        for r, I in enumerate(positions):
+            cols[r, I] = num_col + np.arange(len(I))
+            num_col += len(I)
+    if compress_positions:
+        print(f"Event positions: {(y_col >= 0).sum()} for Y and {(z_col >= 0).sum()} for Z out of {len(P2) * n}")
+
+    blocks, lower, upper = [], [], []
+    constraint_counts = Counter()  # Rows of each constraint family
+
+    def add_rows(A, row_lower, row_upper, family):
+        """Add the rows of the sparse matrix A as row_lower <= A x <= row_upper, bounds per row or for all."""
+        constraint_counts[family] += A.shape[0]
+        blocks.append(A)
+        lower.append(np.broadcast_to(np.asarray(row_lower, dtype=float), A.shape[0]))
+        upper.append(np.broadcast_to(np.asarray(row_upper, dtype=float), A.shape[0]))
+
+    def add_row(cols, values, row_lower, row_upper, family):
+        cols = np.asarray(cols, dtype=np.int64)
+        add_rows(sparse.csr_matrix((values, (np.zeros(len(cols), dtype=np.int64), cols)), shape=(1, num_col)),
+                 row_lower, row_upper, family)
+
+    # Constraint (4): total lanes
+    add_row(range(len(P)), [1] * len(P), l + layout["extra_lanes"], l + layout["extra_lanes"], "(4)")
+
+    # Constraint (5): total bus requirements per type
+    for k in range(len(bus_types)):
+        sizes = exit_size[:, k] + entry_size[:, k]
+        cols = np.flatnonzero(sizes)
+        add_row(cols, sizes[cols], b[k], b[k], "(5)")
+
+    # Side constraints of the depot layout and the outside spots
+    for name, lanes, rules in layout["side_constraints"]:
+        cols = [p for p in range(len(P))
+                if any(pattern_matches(exit_size[p], entry_size[p], bus_types, rule) for rule in rules)]
+        add_row(cols, [1] * len(cols), lanes, lanes, "side")
+    cols = [P.index(pattern) for pattern in outside]
+    add_row(cols, [1] * len(cols), layout["outside_spots"], layout["outside_spots"], "outside")
+
+    # Constraints (6)-(13) in bulk, in the order of the Julia model
+    exit_size2, entry_size2 = exit_size[P2], entry_size[P2]  # Coefficients of Y and Z
+    x_col = np.broadcast_to(np.arange(len(P))[:, None], (len(P), n))  # X is the same column at every position
+    P2_col = np.array(P2, dtype=np.int64)
+    others_low, others_departed = [], []  # Positions of (7) and (11): the indices of all other bus types
+    for k in range(len(bus_types)):
+        others_low.append(np.unique(np.concatenate([indices_low[o] for o in range(len(bus_types)) if o != k])))
+        others_departed.append(np.unique(np.concatenate([departure_indices[o] for o in range(len(bus_types)) if o != k])))
+
+    # Leave out the rows of (7) and (11) implied by the others
+    kept_low = undominated_positions(others_low, a_low, b)
+    kept_departed = undominated_positions(others_departed, no_of_departed, b)
+    dominated_rows = {"(7)": sum(map(len, others_low)) - sum(map(len, kept_low)),
+                      "(11)": sum(map(len, others_departed)) - sum(map(len, kept_departed))}
+    print(f"Dominated rows left out: {dominated_rows['(7)']} of (7) and {dominated_rows['(11)']} of (11)")
+    others_low, others_departed = kept_low, kept_departed
+
+    for V_col, high_indices, high, low_indices, low, families in (
+            (y_col, indices_high, a_high, others_low, a_low, ("(6)", "(7)", "(8)", "(9)")),
+            (z_col, departure_indices, no_of_departed, others_departed, no_of_departed, ("(10)", "(11)", "(12)", "(13)"))):
+        # Constraints (6) and (10): enough lanes have room for the buses of each type
+        A = family_matrix(high_indices, exit_size, x_col, num_col) + family_matrix(high_indices, entry_size2, V_col, num_col)
+        add_rows(A, family_bounds(high_indices, high), np.inf, families[0])
+        # Constraints (7) and (11): exit blocks of each type fill up no faster than buses of the type come
+        add_rows(family_matrix(low_indices, exit_size2, V_col, num_col), -np.inf, family_bounds(low_indices, low), families[1])
+        # Constraints (8) and (12): monotonic over the positions, the columns of a pattern are consecutive
+        cols = V_col[V_col >= 0]
+        last = V_col.max(axis=1)
+        chained = cols[~np.isin(cols, last)]
+        add_rows(difference_matrix(chained, chained + 1, num_col), -np.inf, 0, families[2])
+        # Constraints (9) and (13): at most X lanes of the pattern
+        add_rows(difference_matrix(last, P2_col, num_col), -np.inf, 0, families[3])
+
+    A = sparse.vstack(blocks, format="csr")
+    lower, upper = np.concatenate(lower), np.concatenate(upper)
+
+    # Objective: minimize two-block patterns
+    cost = np.zeros(num_col)
+    cost[P2] = 1
+
+    lp = highspy.HighsLp()
+    lp.num_col_ = num_col
+    lp.num_row_ = A.shape[0]
+    lp.col_cost_ = cost
+    lp.col_lower_ = np.zeros(num_col)
+    lp.col_upper_ = np.full(num_col, np.inf)
+    lp.row_lower_ = lower
+    lp.row_upper_ = upper
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+    lp.a_matrix_.num_col_ = num_col
+    lp.a_matrix_.num_row_ = A.shape[0]
+    lp.a_matrix_.start_ = A.indptr
+    lp.a_matrix_.index_ = A.indices
+    lp.a_matrix_.value_ = A.data
+    lp.integrality_ = [highspy.HighsVarType.kInteger] * num_col
+
+    h = highspy.Highs()
+    h.passModel(lp)
+
+    if start is not None:
+        h.setSolution(start_solution(start, P, P2, y_col, z_col, num_col))
+
+    if time_limit is not None:
+        h.setOptionValue("time_limit", float(time_limit))
+    if mip_gap is not None:
+        h.setOptionValue("mip_rel_gap", float(mip_gap))
+    h.cbMipImprovingSolution.subscribe(lambda event: report_incumbent(
+        event.data_out.objective_function_value,
+        event.data_out.mip_dual_bound if np.isfinite(event.data_out.mip_dual_bound) else None,
+        event.data_out.running_time,
+    ))
+
+    build_time = time.time() - build_start
+    h.run()
+    status = solution_status(h)
+    info = h.getInfo()
+    print(f"Solver status: {status} ({h.modelStatusToString(h.getModelStatus())} after {h.getRunTime():.1f} s)")
+
+    # Model size and where the time went, the same record as the Julia model returns
+    stats = {
+        "buses": n,
+        "patterns": len(P),
+        "two_block_patterns": len(P2),
+        "variables": {"X": len(P), "Y": int((y_col >= 0).sum()), "Z": int((z_col >= 0).sum())},
+        "constraints": dict(constraint_counts),
+        "dominated_rows": dominated_rows,
+        "build_time": build_time,
+        "solve_time": h.getRunTime(),
+        "nodes": info.mip_node_count,
+        "gap": float(info.mip_gap) if status in SOLVED_STATUSES and np.isfinite(info.mip_gap) else None,
+    }
+
+    if status not in SOLVED_STATUSES:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, n), dtype=np.int16), np.zeros((0, n), dtype=np.int16), P, status, stats
+    print(f"Objective: {info.objective_function_value:g}, bound: {info.mip_dual_bound:g}, gap: {info.mip_gap:g}")
+    values = np.asarray(h.getSolution().col_value)
+
+    X = np.rint(values[:len(P)]).astype(np.int64)
+    print("")
+    print("Selected Patterns:")
+    for p in np.flatnonzero(X > 0.5):
+        print(f"Pattern {p + 1}: {P[p]} - Count: {X[p]}")
+
+    return X, position_values(values, y_col), position_values(values, z_col), P, status, stats
+
+
+def solution_status(h):
+    """Status flag of a finished solve, the same flags as solution_status in the Julia model."""
+    model_status = h.getModelStatus()
+    if model_status == highspy.HighsModelStatus.kOptimal:
+        return "OPTIMAL"
+    if h.getInfo().primal_solution_status == highspy.SolutionStatus.kSolutionStatusFeasible:
+        return "FEASIBLE"
+    if model_status == highspy.HighsModelStatus.kInfeasible:
+        return "INFEASIBLE"
+    return "NO_SOLUTION"
+
+
+def start_solution(start, P, P2, y_col, z_col, num_col):
+    """HighsSolution from an earlier solution, patterns are matched by content like in the Julia model."""
+    start_P = [tuple(tuple(block) for block in pattern) for pattern in start["P"]]
+    start_index = {pattern: k for k, pattern in enumerate(start_P)}
+    start_row = {pattern: r for r, pattern in enumerate(p for p in start_P if len(p) == 2)}
+
+    col_value = np.zeros(num_col)
+    for p, pattern in enumerate(P):
+        if tuple(pattern) in start_index:
+            col_value[p] = round(start["X"][start_index[tuple(pattern)]])
+    for r, p in enumerate(P2):
+        k = start_row.get(tuple(P[p]))
+        for V_col, values in ((y_col, start["Y"]), (z_col, start["Z"])):
+            if k is not None and len(values[k]) == V_col.shape[1]:
+                present = V_col[r] >= 0
+                col_value[V_col[r][present]] = np.round(np.asarray(values[k], dtype=float)[present])
+
+    print(f"Warm start from {sum(tuple(pattern) in start_index for pattern in P)} of {len(P)} patterns")
+    solution = highspy.HighsSolution()
+    solution.col_value = col_value
+    solution.value_valid = True
+    return solution
+
+
+def position_values(values, cols):
+    """
+    (|P2| x n) int16 values of Y or Z, a position without a variable gets the value of the previous
+    position that has one (0 before the first), which keeps the model's constraints satisfied.
+    """
+    n = cols.shape[1]
+    last = np.maximum.accumulate(np.where(cols >= 0, np.arange(n), -1), axis=1)
+    source = np.take_along_axis(cols, np.maximum(last, 0), axis=1)
+    return np.rint(np.where(last >= 0, values[source], 0.0)).astype(np.int16)
+
+
+def optimize_model(model, function, l, v, max_deviation, arrivals, departures, warm_start=False, **options):
+    """
+    Drop-in replacement of julia_solver.optimize_model that solves in this process.
+
+    model and function are only there for the same call signature, the layout option selects
+    the side constraints. With warm_start the solutions are shared with the Julia path.
+    """
+    if warm_start:
+        start = load_solution(l, v)
+        if start is not None:
+            options["start"] = start
+    X, Y, Z, P, status, stats = optimize_model_k_approach(l, v, max_deviation, arrivals, departures, **options)
+    if warm_start and status in SOLVED_STATUSES:
+        save_solution(l, v, X, Y, Z, P)
+    return X, Y, Z, P, status, stats
@@ -0,0 +1,285 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+# Unix socket of the solver process, see solver_server.jl
+SOCKET_PATH = os.environ.get("K_POSITION_SOCKET", os.path.join(tempfile.gettempdir(), "k_position_solver.sock"))
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solver_server.jl")
+# Julia environment with the pinned JuMP, HiGHS and JSON versions, see Project.toml
+JULIA_PROJECT = os.path.dirname(SERVER_SCRIPT)
+# Custom sysimage with JuMP, HiGHS and JSON precompiled for the model's workload, built by build_sysimage.jl.
+# The model file is still loaded from source when the server starts.
+SYSIMAGE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "k_position_sysimage." + ("dll" if sys.platform == "win32" else "dylib" if sys.platform == "darwin" else "so"),
+)
+# The server log, what the solver prints outside of requests ends up here
+SERVER_LOG = os.path.join(tempfile.gettempdir(), "k_position_solver.log")
+# Seconds to wait for a freshly started server, loading JuMP and HiGHS takes a while
+START_TIMEOUT = 600
+# Status flags of a solve that returned a plan to park with, see solution_status in the model file
+SOLVED_STATUSES = ("OPTIMAL", "FEASIBLE")
+# Last solution of each depot configuration, used as the warm start of the next solve
+SOLUTION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+# One JSON line of model size and timing statistics per solve, to follow model growth and regressions
+STATS_LOG = os.environ.get("K_POSITION_STATS_LOG", os.path.join(SOLUTION_DIR, "solve-stats.jsonl"))
+
+
+class SolverClient:
+    """
+    Connection to the long-lived Julia solver process.
+
+    The process is started on first use if it is not already running and is left
+    running afterwards, so later runs only pay for the solve itself.
+
+    Args:
+        socket_path (str): Unix socket of the server.
+        start (bool): Start the server if nobody is listening on socket_path.
+    """
+    def __init__(self, socket_path=SOCKET_PATH, start=True):
+        self.socket_path = socket_path
+        self.incumbents = 0  # Improved solutions received during the last request
+        try:
+            self.connect()
+        except OSError:
+            if not start:
+                raise
+            start_server(socket_path)
+            self.connect()
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+        self.file = self.sock.makefile("rw", encoding="utf-8")
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def request(self, request):
+        """
+        Send one request and return the decoded response, raise RuntimeError on solver errors.
+        Improved solutions the solver sends while solving are printed as they arrive.
+        """
+        self.file.write(json.dumps(request) + "\n")
+        self.file.flush()
+        self.incumbents = 0
+        while True:
+            line = self.file.readline()
+            if not line:
+                raise RuntimeError("The solver process closed the connection")
+            response = json.loads(line)
+            if "incumbent" not in response:
+                break
+            self.incumbents += 1
+            report_incumbent(**response["incumbent"])
+        if "error" in response:
+            raise RuntimeError(f"Solver error: {response['error']}")
+        return response
+
+    def optimize(self, model, function, l, v, max_deviation, arrivals, departures, **options):
+        """
+        Solve the k-position model.
+
+        Args:
+            model (str): Julia file of the model, e.g. "k_position_approach.jl".
+            function (str): Model function in that file, e.g. "optimize_model_k_approach".
+            l, v, max_deviation, arrivals, departures: Arguments of the model function, arrivals and
+                departures as bus type names or, with the types option, as type codes.
+            **options: Keyword arguments of the model function, e.g. layout="LASU", compress_positions=True,
+                time_limit=300 (seconds), mip_gap=0.01, types=week.types for type codes or start=solution
+                for a warm start, see load_solution.
+
+        Returns:
+            tuple: X as an integer array, Y and Z as (|P2| x n) int16 arrays with rows only for the
+                two-block patterns (see parking_busses.twoBlockRows), P as lists of (bus_type, block_size)
+                tuples. Then the status flag,
+                X, Y and Z can be parked only if it is in SOLVED_STATUSES, and the statistics dict
+                with the number of improved solutions reported while solving as "incumbents".
+        """
+        response = self.request({
+            "model": model,
+            "function": function,
+            "args": [l, v, max_deviation, np.asarray(arrivals).tolist(), np.asarray(departures).tolist()],
+            "options": options,
+        })
+        print(response["output"], end="")
+        response["stats"]["incumbents"] = self.incumbents
+        if response["status"] in SOLVED_STATUSES and not self.incumbents:
+            # The callback goes through the HiGHS C API, which may change with the HiGHS.jl version
+            print("Warning: the solver reported no improved solutions while solving, "
+                  "check the HiGHS.jl version against Project.toml")
+
+        X = np.asarray(response["X"], dtype=np.int64)
+        P = patterns_from_table(**response["P"])
+        return X, dense_from_triplets(response["Y"]), dense_from_triplets(response["Z"]), P, response["status"], response["stats"]
+
+
+def dense_from_triplets(triplets):
+    """(|P2| x n) int16 array from the nonzeros the solver sends, see solver_server.jl."""
+    V = np.zeros(triplets["shape"], dtype=np.int16)
+    V[np.asarray(triplets["rows"], dtype=np.intp), np.asarray(triplets["cols"], dtype=np.intp)] = triplets["values"]
+    return V
+
+
+def patterns_from_table(types, table):
+    """
+    Patterns from the table of type codes and block sizes the solver sends.
+
+    Args:
+        types (list): Bus type of each code.
+        table (list): [exit type, exit size, entry type, entry size] per pattern, entry type -1 for one-block patterns.
+
+    Returns:
+        list: Patterns as lists of (bus_type, block_size) tuples.
+    """
+    return [
+        [(types[exit_type], exit_size)] + ([(types[entry_type], entry_size)] if entry_type >= 0 else [])
+        for exit_type, exit_size, entry_type, entry_size in table
+    ]
+
+
+def report_incumbent(objective, bound, elapsed):
+    """Print an improved solution found while solving."""
+    bound = "-" if bound is None else f"{bound:g}"
+    print(f"Incumbent {objective:g} (bound {bound}) after {elapsed:.1f} s", flush=True)
+
+
+def julia_command():
+    """Command to start Julia, with the precompiled sysimage if it has been built."""
+    command = ["julia", f"--project={JULIA_PROJECT}"]
+    if os.path.exists(SYSIMAGE_PATH):
+        command.append(f"--sysimage={SYSIMAGE_PATH}")
+    return command
+
+
+def start_server(socket_path=SOCKET_PATH, timeout=START_TIMEOUT):
+    """Start solver_server.jl in the background and wait until it accepts connections."""
+    log = open(SERVER_LOG, "a")
+    process = subprocess.Popen(
+        julia_command() + [SERVER_SCRIPT, socket_path],
+        cwd=os.path.dirname(SERVER_SCRIPT),
+        stdout=log,
+        stderr=subprocess.STDOUT,
+        start_new_session=True,  # Keep running after this Python process exits
+    )
+    print(f"Starting the Julia solver process, log in {SERVER_LOG}")
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The solver process exited with code {process.returncode}, see {SERVER_LOG}")
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(socket_path)
+                return process
+        except OSError:
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError(f"The solver process did not start in {timeout} seconds, see {SERVER_LOG}")
+
+
+def stop_server(socket_path=SOCKET_PATH):
+    """Ask a running solver process to exit."""
+    client = SolverClient(socket_path, start=False)
+    try:
+        client.request({"command": "shutdown"})
+    finally:
+        client.close()
+
+
+def solution_path(l, v):
+    """File of the last solution for a depot with l lanes of length v."""
+    return os.path.join(SOLUTION_DIR, f"solution-l{l}-v{v}.json")
+
+
+def load_solution(l, v):
+    """
+    Last solution saved for the depot configuration, or None.
+
+    Returns:
+        dict: X, Y, Z and P in the form the model functions accept as their start argument.
+    """
+    try:
+        with open(solution_path(l, v), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_solution(l, v, X, Y, Z, P):
+    """Save a solution as the warm start of the next solve with the same depot configuration."""
+    os.makedirs(SOLUTION_DIR, exist_ok=True)
+    path = solution_path(l, v)
+    tmp_path = f"{path}.{os.getpid()}.tmp"  # Nights solved in parallel may save at the same time
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"X": np.asarray(X).tolist(), "Y": np.asarray(Y).tolist(), "Z": np.asarray(Z).tolist(), "P": P}, f)
+    os.replace(tmp_path, path)
+
+
+def log_stats(stats, **context):
+    """
+    Append the statistics of a solve to STATS_LOG as one JSON line.
+
+    Args:
+        stats (dict): Statistics returned by the model: patterns, variables and constraints per family,
+            build and solve time, nodes and gap.
+        **context: Fields identifying the solve, e.g. night, l, v, layout and status.
+    """
+    os.makedirs(os.path.dirname(STATS_LOG), exist_ok=True)
+    record = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "engine": os.environ.get("K_POSITION_ENGINE", "julia"),
+        **context,
+        **stats,
+    }
+    with open(STATS_LOG, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+# Open connections by socket path, so that every process talks to its own solver
+_clients = {}
+
+
+def optimize_model(model, function, l, v, max_deviation, arrivals, departures, warm_start=False,
+                   socket_path=SOCKET_PATH, **options):
+    """
+    Solve the k-position model on a shared solver process, see SolverClient.optimize.
+
+    With warm_start the last solution for the same l and v is passed as the start and the
+    new solution is saved in its place, so consecutive nights start from each other.
+    socket_path selects the solver process, e.g. one per night when nights are solved in parallel.
+    """
+    if socket_path not in _clients:
+        _clients[socket_path] = SolverClient(socket_path)
+    if warm_start:
+        start = load_solution(l, v)
+        if start is not None:
+            options["start"] = start
+    X, Y, Z, P, status, stats = _clients[socket_path].optimize(model, function, l, v, max_deviation, arrivals, departures, **options)
+    if warm_start and status in SOLVED_STATUSES:
+        save_solution(l, v, X, Y, Z, P)
+    return X, Y, Z, P, status, stats
+
+
+if __name__ == "__main__":
+    # python julia_solver.py start|stop|build
+    command = sys.argv[1] if len(sys.argv) > 1 else "start"
+    if command == "start":
+        SolverClient().close()
+        print(f"Solver listening on {SOCKET_PATH}")
+    elif command == "stop":
+        stop_server()
+    elif command == "build":
+        # Takes several minutes, restart a running server afterwards to use the new sysimage
+        build_script = os.path.join(os.path.dirname(SERVER_SCRIPT), "build_sysimage.jl")
+        subprocess.run(["julia", f"--project={JULIA_PROJECT}", build_script], check=True)
+    else:
+        print("Usage: python julia_solver.py start|stop|build")
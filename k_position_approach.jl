@@ -1,22 +1,387 @@
-using JuMP, HiGHS
+using JuMP, HiGHS, SparseArrays
+
+# DEPOT LAYOUTS
+#
+# The depot specific side constraints are data instead of code, so every night is built by the
+# same function and compiled only once. A side constraint fixes the number of lanes that use a
+# pattern matching any of its pattern rules.
+
+# Matches a block that holds one of `types` with a block size in `sizes`
+struct BlockRule
+    types::Vector{String}
+    sizes::UnitRange{Int}
+end
+
+# Matches a pattern by its exit block and entry block, entry === nothing matches any entry block (or none)
+struct PatternRule
+    exit::BlockRule
+    entry::Union{BlockRule, Nothing}
+end
+
+# Exactly `lanes` lanes use patterns matching one of `patterns`
+struct LaneConstraint
+    name::String
+    lanes::Int
+    patterns::Vector{PatternRule}
+end
+
+struct DepotLayout
+    extra_lanes::Int                         # Lanes on top of the l regular ones (outside spots etc.)
+    single_spot_types::Vector{String}        # Bus types with a one-block pattern of size 1
+    outside_spots::Int                       # Lanes in patterns length(P) .- outside_spot_offsets, 2:4 is
+                                             # STS and STV and the last two-block pattern as before
+                                             # (counted in all patterns, before prune_patterns)
+    outside_spot_offsets::UnitRange{Int}
+    side_constraints::Vector{LaneConstraint}
+end
+
+const ANY_SIZE = 1:typemax(Int)
+const DIESEL = ["DMV", "DMS"]
+const ELECTRIC = ["SMV", "SMS"]
+const SMALL = ["STS", "STV"]
+
+# G, K and L
+const LANES_GKL = LaneConstraint("G, K and L", 3, [
+    PatternRule(BlockRule(DIESEL, ANY_SIZE), BlockRule(DIESEL, ANY_SIZE)),
+    PatternRule(BlockRule(DIESEL, 6:6), nothing),
+])
+# B, C, D, E and F (Telit)
+const LANES_BCDEF = LaneConstraint("B, C, D, E and F", 5, [
+    PatternRule(BlockRule(ELECTRIC, ANY_SIZE), BlockRule(SMALL, 1:1)),
+])
+# A (not in use): LaneConstraint("A", 1, [PatternRule(BlockRule(ELECTRIC, ANY_SIZE), nothing)])
+
+const MATO_LAYOUT = DepotLayout(17 + 3, [SMALL; DIESEL], 17, 2:4, [
+    # H, I and J
+    LaneConstraint("H", 1, [PatternRule(BlockRule(DIESEL, 1:1), BlockRule(["SMV"], ANY_SIZE))]),
+    LaneConstraint("I", 1, [PatternRule(BlockRule(DIESEL, 1:1), BlockRule(["SMS"], ANY_SIZE))]),
+    LaneConstraint("J", 1, [PatternRule(BlockRule(DIESEL, 5:5), BlockRule(ELECTRIC, ANY_SIZE))]),
+    LANES_GKL,
+    LANES_BCDEF,
+])
+
+const LASU_LAYOUT = DepotLayout(17 + 3, [SMALL; DIESEL], 17, 2:4, [
+    LaneConstraint("H, I and J", 3, [PatternRule(BlockRule(DIESEL, ANY_SIZE), BlockRule(ELECTRIC, ANY_SIZE))]),
+    LANES_GKL,
+    LANES_BCDEF,
+])
+
+# Layout of each night, PE shares the rules of MA-TO
+const DEPOT_LAYOUTS = Dict(
+    "MATO" => MATO_LAYOUT,
+    "PELA" => MATO_LAYOUT,
+    "LASU" => LASU_LAYOUT,
+)
+
+# sizes is a row of exit_size or entry_size, the block size of each bus type (0 for none)
+block_matches(sizes, bus_types, rule::BlockRule) =
+    any(sizes[k] in rule.sizes for k in eachindex(bus_types) if bus_types[k] in rule.types)
+
+function pattern_matches(exit, entry, bus_types, rule::PatternRule)
+    return block_matches(exit, bus_types, rule.exit) && (rule.entry === nothing || block_matches(entry, bus_types, rule.entry))
+end
+
+
+# MODEL INPUTS
+#
+# Bus types are integer codes from here on: row k of the count matrices and column k of the
+# exit_size and entry_size matrices is bus_types[k]. Row 0 is a type that does not arrive.
+
+# Cumulative counts: counts[k, i] is the number of buses of type row k among the first i
+# (works for arrivals and departures alike)
+function cumulative_counts(rows, num_types)
+    counts = zeros(Int, num_types, length(rows))
+    for (i, k) in enumerate(rows)
+        if i > 1
+            counts[:, i] .= counts[:, i-1]
+        end
+        if k > 0  # Departures may include types that do not arrive
+            counts[k, i] += 1
+        end
+    end
+    return counts
+end
+
+# Bounds on the number of buses of each type arrived by position i, when every bus may arrive
+# up to max_deviation positions earlier (a_high) or later (a_low) than planned. Same result as
+# moving each bus of the type max_deviation steps left or right, straight from shifted counts.
+function compute_max_min_arrivals(arrival_rows, num_types, max_deviation)
+    counts = cumulative_counts(arrival_rows, num_types)
+    n = length(arrival_rows)
+    total = counts[:, n]
+    a_high = similar(counts)
+    a_low = similar(counts)
+    for i in 1:n
+        a_high[:, i] .= min.(counts[:, min(i + max_deviation, n)], i)
+        earlier = i > max_deviation ? counts[:, i - max_deviation] : zeros(Int, num_types)
+        a_low[:, i] .= max.(earlier, total .- (n - i))
+    end
+    return a_high, a_low
+end
+
+# Positions where the count of each type row goes up, i.e. where a bus of that type arrives or departs
+function count_indices(counts)
+    return [[i for i in 1:size(counts, 2) if counts[k, i] > (i > 1 ? counts[k, i-1] : 0)]
+            for k in 1:size(counts, 1)]
+end
+
+# Function to generate all admissible patterns with an indicator. Returns the patterns, their
+# types (1 for one-block, 2 for two-block) and the exit and entry block sizes as dense
+# (|P| x |bus_types|) matrices, zero where the pattern has no block of that type.
+# With counts (buses of each bus type) dominated patterns are left out: a block larger than the
+# number of buses of its type can never be filled, so (5) keeps X of such a pattern at 0. The
+# patterns in keep (the outside spots) and those of types that do not arrive are always kept.
+function generate_patterns(v, bus_types, single_spot_types, counts=nothing, keep=Vector{Tuple{String, Int}}[])
+    patterns = Vector{Tuple{String, Int}}[]
+    pattern_types = Int[]
+
+    # One-block patterns (cover all bus types)
+    for t in bus_types
+        push!(patterns, [(t, v)])
+        push!(pattern_types, 1)
+    end
 
-function optimize_model_k_approach(l::Int, v::Int, max_deviation::Int, arrivals, departures)
-    # Convert Python list to Julia array
-    arrivals = collect(arrivals)
-    departures = collect(departures)
+    # Two-block patterns
+    for (i, t1) in enumerate(bus_types), (j, t2) in enumerate(bus_types)
+        if i != j  # Ensure different types
+            for s1 in 1:(v-1)  # Exit block size
+                s2 = v - s1  # Entry block size
+                push!(patterns, [(t1, s1), (t2, s2)])
+                push!(pattern_types, 2)
+            end
+        end
+    end
 
-    # Extract bus types (unique elements in arrivals)
-    bus_types = unique(arrivals)
+    # Additional one-block patterns with size 1 (Teli and Diesel)
+    for t in single_spot_types
+        push!(patterns, [(t, 1)])
+        push!(pattern_types, 1)
+    end
+
+    type_row = Dict(t => k for (k, t) in enumerate(bus_types))
+    if counts !== nothing
+        fits(pattern) = pattern in keep || all(!haskey(type_row, t) || s <= counts[type_row[t]] for (t, s) in pattern)
+        kept = findall(fits, patterns)
+        patterns, pattern_types = patterns[kept], pattern_types[kept]
+    end
+
+    # Single spot types that do not arrive get no exit block, as the one-block dicts before
+    exit_size = zeros(Int, length(patterns), length(bus_types))
+    entry_size = zeros(Int, length(patterns), length(bus_types))
+    for (p, pattern) in enumerate(patterns)
+        t, s = pattern[1]
+        haskey(type_row, t) && (exit_size[p, type_row[t]] = s)
+        if length(pattern) == 2
+            entry_size[p, type_row[pattern[2][1]]] = pattern[2][2]
+        end
+    end
+
+    return patterns, pattern_types, exit_size, entry_size
+end
+
+# Patterns of each (v, bus types, single spot types, counts, keep), shared by all nights solved in
+# this process. The returned structures must not be modified.
+const PATTERN_CACHE = Dict{Tuple{Int, Vector{String}, Vector{String}, Union{Nothing, Vector{Int}}, Vector{Vector{Tuple{String, Int}}}}, Any}()
+
+function cached_patterns(v, bus_types, single_spot_types, counts=nothing, keep=Vector{Tuple{String, Int}}[])
+    key = (v, collect(String, bus_types), collect(String, single_spot_types),
+           counts === nothing ? nothing : collect(Int, counts), collect(Vector{Tuple{String, Int}}, keep))
+    return get!(() -> generate_patterns(v, bus_types, single_spot_types, counts, keep), PATTERN_CACHE, key)
+end
+
+
+# CONSTRAINT MATRICES
+#
+# Constraints (6), (7), (10) and (11) have one row per bus type k and position i in positions[k], in
+# that order. Each family is assembled in bulk as a sparse matrix from a (columns x types) coefficient
+# matrix and added with one matrix-form @constraint, instead of a sum over all patterns per row. Only
+# used with matrix_constraints=true until it has been checked against the loops (check_engines.py).
+
+# Sparse (rows x num_cols) matrix with coefficient[c, k] on column cols[c, i] in the row of (k, i) for
+# every c with a nonzero coefficient, cols[c, i] being the variable column of c at position i
+function family_matrix(positions, coefficient, cols, num_cols)
+    I, J, W = Int[], Int[], Int[]
+    num_rows = 0
+    for k in eachindex(positions)
+        nonzero = findall(!iszero, view(coefficient, :, k))
+        rows = num_rows .+ (1:length(positions[k]))
+        append!(I, repeat(rows, inner=length(nonzero)))
+        append!(J, vec(cols[nonzero, positions[k]]))
+        append!(W, repeat(coefficient[nonzero, k], outer=length(rows)))
+        num_rows += length(rows)
+    end
+    return sparse(I, J, W, num_rows, num_cols)
+end
+
+# Positions of the rows of (7) or (11) that are not implied by the others. Y and Z only grow with the
+# position, (8) and (12), and the bounds never decrease, so a row is implied by the last row of its run
+# of equal bounds. A bound of at least the total of the type holds by (5) with (9) or (13) already.
+function undominated_positions(positions, bound, total)
+    kept = Vector{Int}[]
+    for k in eachindex(positions)
+        I = sort(positions[k])
+        push!(kept, [i for (j, i) in enumerate(I) if bound[k, i] < total[k] && (j == length(I) || bound[k, I[j+1]] > bound[k, i])])
+    end
+    return kept
+end
+
+# Right-hand side of a family in the same row order
+family_bounds(positions, bound) = [bound[k, i] for k in eachindex(positions) for i in positions[k]]
+
+# Column of the variable of two-block pattern row r at position i in the flat vector of Y or Z
+# variables (0 without a variable), columns numbered pattern by pattern in position order
+function flat_columns(positions, n)
+    cols = zeros(Int, length(positions), n)
+    num_cols = 0
+    for (r, I) in enumerate(positions)
+        cols[r, I] .= num_cols .+ (1:length(I))
+        num_cols += length(I)
+    end
+    return cols
+end
+
+# Constraints (6)-(13) in matrix form over flat vectors y and z of the Y and Z variables, the same
+# rows as the loops in optimize_model_k_approach (with matrix_constraints=true). The variables of a
+# pattern are consecutive in y and z, in the order of their positions.
+function add_matrix_constraints!(model, X, Y, Z, P2, I_Y, I_Z, n, exit_size, entry_size,
+                                 indices_high, a_high, others_low, a_low,
+                                 departure_indices, no_of_departed, others_departed, count_constraints!)
+    num_patterns = length(X)
+    y_cols = flat_columns([I_Y[p] for p in P2], n)
+    z_cols = flat_columns([I_Z[p] for p in P2], n)
+    y = [Y[p, i] for p in P2 for i in I_Y[p]]
+    z = [Z[p, i] for p in P2 for i in I_Z[p]]
+    y_last = cumsum([length(I_Y[p]) for p in P2])  # Last position of each pattern
+    z_last = cumsum([length(I_Z[p]) for p in P2])
+    x_cols = repeat(1:num_patterns, 1, n)  # X is the same column at every position
+    exit_size2, entry_size2 = exit_size[P2, :], entry_size[P2, :]  # Coefficients of Y and Z
+
+    # Constraint (6)
+    @constraint(model,
+        family_matrix(indices_high, exit_size, x_cols, num_patterns) * X .+
+        family_matrix(indices_high, entry_size2, y_cols, length(y)) * y
+        .>= family_bounds(indices_high, a_high)
+    )
+    count_constraints!("(6)")
+
+    # Constraint (7)
+    @constraint(model, family_matrix(others_low, exit_size2, y_cols, length(y)) * y .<= family_bounds(others_low, a_low))
+    count_constraints!("(7)")
+
+    # Constraint (8)
+    chained = setdiff(1:length(y), y_last)
+    @constraint(model, y[chained] .<= y[chained .+ 1])
+    count_constraints!("(8)")
+
+    # Constraint (9)
+    @constraint(model, y[y_last] .<= X[P2])
+    count_constraints!("(9)")
+
+    # Constraint (10)
+    @constraint(model,
+        family_matrix(departure_indices, exit_size, x_cols, num_patterns) * X .+
+        family_matrix(departure_indices, entry_size2, z_cols, length(z)) * z
+        .>= family_bounds(departure_indices, no_of_departed)
+    )
+    count_constraints!("(10)")
+
+    # Constraint (11)
+    @constraint(model, family_matrix(others_departed, exit_size2, z_cols, length(z)) * z .<= family_bounds(others_departed, no_of_departed))
+    count_constraints!("(11)")
+
+    # Constraint (12)
+    chained = setdiff(1:length(z), z_last)
+    @constraint(model, z[chained] .<= z[chained .+ 1])
+    count_constraints!("(12)")
+
+    # Constraint (13)
+    @constraint(model, z[z_last] .<= X[P2])
+    count_constraints!("(13)")
+end
+
+
+# THE K-POSITION MODEL
+
+# Called by HiGHS for the events started with Highs_startCallback, here only improved MIP solutions.
+# user_data points to the on_incumbent function of optimize_model_k_approach. This uses the C API of
+# the HiGHS library that HiGHS.jl ships, so it is tied to the HiGHS.jl version pinned in Project.toml.
+function incumbent_callback(callback_type::Cint, message::Ptr{Cchar}, data_out::Ptr{HiGHS.HighsCallbackDataOut},
+                            data_in::Ptr{HiGHS.HighsCallbackDataIn}, user_data::Ptr{Cvoid})::Cvoid
+    if callback_type == HiGHS.kHighsCallbackMipImprovingSolution
+        out = unsafe_load(data_out)
+        on_incumbent = unsafe_pointer_to_objref(user_data)[]
+        on_incumbent(out.objective_function_value, out.mip_dual_bound, out.running_time)
+    end
+    return
+end
+
+# Status flag returned with the solution: "OPTIMAL" (within mip_gap), "FEASIBLE" (stopped early,
+# e.g. by the time limit, with the best plan found), "INFEASIBLE" or "NO_SOLUTION" (stopped early
+# without any plan). X, Y and Z are empty in the last two cases.
+function solution_status(model)
+    termination = termination_status(model)
+    if termination == MOI.OPTIMAL
+        return "OPTIMAL"
+    elseif primal_status(model) == MOI.FEASIBLE_POINT
+        return "FEASIBLE"
+    elseif termination == MOI.INFEASIBLE
+        return "INFEASIBLE"
+    end
+    return "NO_SOLUTION"
+end
+
+# Non-finite numbers (no bound or gap yet) as nothing, which JSON can hold
+finite_or_nothing(x) = isfinite(x) ? x : nothing
+
+"""
+    optimize_model_k_approach(l, v, max_deviation, arrivals, departures; layout="MATO", ...)
+
+Solve the k-position model for one night. `layout` is a key of DEPOT_LAYOUTS ("MATO", "PELA" or
+"LASU") or a DepotLayout. `time_limit` (seconds) and `mip_gap` (relative) stop the solve early,
+`on_incumbent(objective, bound, elapsed)` is called for every improved solution. Returns X, Y, Z,
+P, the status flag of solution_status and a Dict of model size and timing statistics, with Y and
+Z as (|P2| x n) Int16 matrices. With `types` (e.g. WeekTimetable.types) arrivals and departures are
+0-based codes into it, otherwise bus type names. `prune_patterns` leaves out the patterns that
+no lane can use with the bus counts of the night, see generate_patterns. `matrix_constraints`
+adds (6)-(13) in matrix form (add_matrix_constraints!) instead of one row at a time.
+"""
+function optimize_model_k_approach(l::Int, v::Int, max_deviation::Int, arrivals, departures;
+                                   layout="MATO", compress_positions::Bool=false, start=nothing,
+                                   time_limit=nothing, mip_gap=nothing, on_incumbent=nothing, types=nothing,
+                                   prune_patterns::Bool=false, matrix_constraints::Bool=false)
+    build_start = time()
+    layout = layout isa DepotLayout ? layout : DEPOT_LAYOUTS[layout]
+
+    # Arrivals and departures as 1-based codes into types, names are only looked up once here
+    if types === nothing
+        types = unique([collect(String, arrivals); collect(String, departures)])
+        code = Dict(t => k for (k, t) in enumerate(types))
+        arrivals = [code[t] for t in arrivals]
+        departures = [code[t] for t in departures]
+    else
+        types = collect(String, types)
+        arrivals = Int.(collect(arrivals)) .+ 1
+        departures = Int.(collect(departures)) .+ 1
+    end
+
+    # Extract bus types (unique elements in arrivals), their row is the order of first arrival
+    arriving = unique(arrivals)
+    bus_types = types[arriving]
+    num_types = length(bus_types)
+    row = zeros(Int, length(types))
+    row[arriving] .= 1:num_types
+    arrival_rows = row[arrivals]
+    departure_rows = row[departures]  # 0 for types that do not arrive
 
     # Count occurrences of each bus type in arrivals
-    b = Dict(t => count(x -> x == t, arrivals) for t in bus_types)
-    
+    b = [count(==(k), arrival_rows) for k in 1:num_types]
+
     println("Number of lanes: $l")
     println("Length of lanes: $v")
     println("Bus types:")
     println(bus_types)
     println("Bus counts:")
-    println(b)
+    println(Dict(zip(bus_types, b)))
 
     # Define parameters
     #l = 2  # Number of lanes
@@ -25,73 +390,10 @@ function optimize_model_k_approach(l::Int, v::Int, max_deviation::Int, arrivals,
     #b = Dict("A" => 5, "B" => 4, "C" => 3)  # Total buses of each type
     #b = Dict("A" => 3, "B" => 2, "C" => 1)  # Total buses of each type
     #b = Dict("A" => 4, "B" => 3, "C" => 3)  # Total buses of each type
-    n = sum(values(b))
+    n = sum(b)
     #max_deviation = 1
     println("The number of buses is $n.")
 
-    #Works also for calculating number of buses departed
-    function calculate_no_of_buses_arrived(arrivals, bus_type)
-        buses_arrived = zeros(Int, length(arrivals))
-        indices_with_arrival = Int[]
-        for i in 1:length(arrivals)
-            buses_arrived[i] = (i > 1 ? buses_arrived[i-1] : 0) + (arrivals[i] == bus_type ? 1 : 0)
-            if arrivals[i] == bus_type
-                push!(indices_with_arrival, i)  # Add the index to the list of indices with arrival
-            end
-            #println("At index $i: Number of $bus_type buses arrived = $buses_arrived[i]")
-        end
-        buses_arrived_at_indices = buses_arrived
-        #buses_arrived_at_indices = [buses_arrived[i] for i in indices_with_arrival]
-        return indices_with_arrival, buses_arrived_at_indices
-    end
-
-    function compute_max_min_arrivals(arrivals, bus_type, max_deviation, max_or_min)
-        
-        if max_or_min == "max"
-            # Move the indices to the left by `max_deviation` steps, one step at a time
-            for i in 1:length(arrivals)
-                if arrivals[i] == bus_type
-                    # Move step by step by max_deviation steps to the left
-                    for j in 1:max_deviation
-                        if i > 1
-                            # Swap the element with the one on the left
-                            arrivals[i], arrivals[i-1] = arrivals[i-1], arrivals[i]
-                            #println("Moved element at index $i to index $(i-1): ", arrivals)
-                            i -= 1  # Move to the next index left
-                        end
-                    end
-                end
-            end
-            indices_with_arrival, buses_arrived_at_indices = calculate_no_of_buses_arrived(arrivals, bus_type)
-        end
-        
-        if max_or_min == "min"
-            # Move the indices to the right by `max_deviation` steps, one step at a time
-            for i in length(arrivals):-1:1
-                if arrivals[i] == bus_type
-                    # Move step by step by max_deviation steps to the right
-                    for j in 1:max_deviation
-                        if i < length(arrivals)
-                            # Swap the element with the one on the right
-                            arrivals[i], arrivals[i+1] = arrivals[i+1], arrivals[i]
-                            #println("Moved element at index $i to index $(i+1): ", arrivals)
-                            i += 1  # Move to the next index right
-                        end
-                    end
-                end
-            end
-            indices_with_arrival, buses_arrived_at_indices = calculate_no_of_buses_arrived(arrivals, bus_type)
-        end
-
-        return indices_with_arrival, buses_arrived_at_indices
-    end
-
-
-    function compute_departure_indices(departures, bus_type)
-        indices_with_departure, buses_departed_at_indices = calculate_no_of_buses_arrived(departures, bus_type)
-        return indices_with_departure, buses_departed_at_indices
-    end
-
     # Example usage:
 
     # Define your planned arrival scenario (single scenario now)
@@ -106,31 +408,12 @@ function optimize_model_k_approach(l::Int, v::Int, max_deviation::Int, arrivals,
     #println("Departures in order: $departures")
     #println("")
 
-    #compute_max_min_arrivals(arrivals, "B", 1, "max")
-
-    indices_high = Dict()
-    a_high = Dict()
-
-    indices_low = Dict()
-    a_low = Dict()
-
-    departure_indices = Dict()
-    no_of_departed = Dict()
-
-    for t in bus_types
-        arrivals_copy = copy(arrivals)
-        indices_low[t], a_low[t] = compute_max_min_arrivals(arrivals_copy, t, max_deviation, "min")
-    end
+    a_high, a_low = compute_max_min_arrivals(arrival_rows, num_types, max_deviation)
+    indices_high = count_indices(a_high)
+    indices_low = count_indices(a_low)
 
-    for t in bus_types
-        arrivals_copy = copy(arrivals)
-        indices_high[t], a_high[t] = compute_max_min_arrivals(arrivals_copy, t, max_deviation, "max")
-    end
-
-    for t in bus_types
-        departures_copy = copy(departures)
-        departure_indices[t], no_of_departed[t] = compute_departure_indices(departures_copy, t)
-    end
+    no_of_departed = cumulative_counts(departure_rows, num_types)
+    departure_indices = count_indices(no_of_departed)
 
     # Print the results
     #println("Indices: ", indices_high)
@@ -142,253 +425,247 @@ function optimize_model_k_approach(l::Int, v::Int, max_deviation::Int, arrivals,
     #println("Indices: ", departure_indices)
     #println("no_of_departed: ", no_of_departed)
 
-    # Function to generate all admissible patterns with an indicator
-    function generate_patterns(v, bus_types)
-        patterns = []
-        pattern_types = Dict()  # Store whether pattern is one-block (1) or two-block (2)
-        exit_block = Dict()
-        entry_block = Dict()
-
-        # One-block patterns (cover all bus types in dict)
-        for t in bus_types
-            pattern = [(t, v)]
-            push!(patterns, pattern)
-            pattern_types[length(patterns)] = 1  # Mark as one-block
-
-            # Exit dict: Only store nonzero values
-            exit_dict = Dict(bt => v for bt in bus_types if bt == t)
-            entry_dict = Dict()  # Empty because no entry occurs in a one-block pattern
-
-            exit_block[length(patterns)] = exit_dict
-            entry_block[length(patterns)] = entry_dict
-        end
-
-        # Two-block patterns
-        for (i, t1) in enumerate(bus_types), (j, t2) in enumerate(bus_types)
-            if i != j  # Ensure different types
-                for s1 in 1:(v-1)  # Exit block size
-                    s2 = v - s1  # Entry block size
-                    pattern = [(t1, s1), (t2, s2)]
-                    push!(patterns, pattern)
-                    pattern_types[length(patterns)] = 2  # Mark as two-block
-
-                    # Only store nonzero values in dicts
-                    exit_dict = Dict(t1 => s1)
-                    entry_dict = Dict(t2 => s2)
-
-                    exit_block[length(patterns)] = exit_dict
-                    entry_block[length(patterns)] = entry_dict
-                end
-            end
-        end
-
-        # Additional one-block patterns with size 1 (Teli)
-        for t in ["STS", "STV"]
-            pattern = [(t, 1)]
-            push!(patterns, pattern)
-            pattern_types[length(patterns)] = 1  # Mark as one-block
-    
-            # Exit dict: Only store nonzero values
-            exit_dict = Dict(bt => 1 for bt in bus_types if bt == t)
-            entry_dict = Dict()  # Empty because no entry occurs in a one-block pattern
-    
-            exit_block[length(patterns)] = exit_dict
-            entry_block[length(patterns)] = entry_dict
-        end
-
-        # Additional one-block patterns with size 1 (Diesel)
-        for t in ["DMV", "DMS"]
-            pattern = [(t, 1)]
-            push!(patterns, pattern)
-            pattern_types[length(patterns)] = 1  # Mark as one-block
-    
-            # Exit dict: Only store nonzero values
-            exit_dict = Dict(bt => 1 for bt in bus_types if bt == t)
-            entry_dict = Dict()  # Empty because no entry occurs in a one-block pattern
-    
-            exit_block[length(patterns)] = exit_dict
-            entry_block[length(patterns)] = entry_dict
+    # Generate patterns and indicators
+    P, pattern_types, exit_size, entry_size = cached_patterns(v, bus_types, layout.single_spot_types)
+
+    # Outside spot patterns by content, outside_spot_offsets counts them from the end of all patterns
+    outside = P[length(P) .- layout.outside_spot_offsets]
+    if prune_patterns
+        all_patterns = length(P)
+        P, pattern_types, exit_size, entry_size = cached_patterns(v, bus_types, layout.single_spot_types, b, outside)
+        println("Dominated patterns left out: $(all_patterns - length(P)) of $all_patterns")
+    end
+    outside_columns = [findfirst(==(pattern), P) for pattern in outside]
+
+    # Two-block patterns, the only ones that get Y and Z variables
+    P2 = [p for p in 1:length(P) if pattern_types[p] == 2]
+
+    # Positions i at which each two-block pattern gets Y and Z variables. With compress_positions
+    # only the positions where the pattern appears in constraints (6), (7), (10) or (11): its entry
+    # type in (6)/(10) and its exit type in (7)/(11). Monotonicity (8) and (12) is then chained
+    # between consecutive event positions and the skipped positions are filled in after solving.
+    I_Y = Dict{Int, Vector{Int}}()
+    I_Z = Dict{Int, Vector{Int}}()
+    for p in P2
+        k1, k2 = findfirst(>(0), exit_size[p, :]), findfirst(>(0), entry_size[p, :])  # Exit and entry type
+        if compress_positions
+            I_Y[p] = sort(union(indices_high[k2], [indices_low[k′] for k′ in 1:num_types if k′ ≠ k1]...))
+            I_Z[p] = sort(union(departure_indices[k2], [departure_indices[k′] for k′ in 1:num_types if k′ ≠ k1]...))
+        else
+            I_Y[p] = collect(1:n)
+            I_Z[p] = collect(1:n)
         end
-
-        return patterns, pattern_types, exit_block, entry_block
     end
-
-    # Generate patterns and indicators
-    P, pattern_types, exit_block, entry_block = generate_patterns(v, bus_types)
+    if compress_positions
+        println("Event positions: $(sum(length, values(I_Y))) for Y and $(sum(length, values(I_Z))) for Z out of $(length(P2) * n)")
+    end
 
     # Print patterns with their types
     #println("Patterns:")
     #for i in 1:length(P)
-    #    println("Pattern $i: ", P[i], " - Type: ", pattern_types[i], " - Exit block: ", exit_block[i], " - Entry block: ", entry_block[i])
+    #    println("Pattern $i: ", P[i], " - Type: ", pattern_types[i], " - Exit block: ", exit_size[i, :], " - Entry block: ", entry_size[i, :])
     #end
 
 
-    # THE K-POSITION MODEL
-
     # Initialize JuMP model
     model = Model(HiGHS.Optimizer)
 
+    # Number of constraints added by each constraint family, for the statistics
+    constraint_counts = Dict{String, Int}()
+    counted = 0
+    function count_constraints!(family)
+        total = num_constraints(model; count_variable_in_set_constraints=false)
+        constraint_counts[family] = total - counted
+        counted = total
+    end
+
     # Define decision variables for each pattern
     @variable(model, X[1:length(P)] >= 0, Int)  # One variable per pattern
-    @variable(model, Y[1:length(P), 1:n] >= 0, Int)  # Integer variable for assignments
-    @variable(model, Z[1:length(P), 1:n] >= 0, Int)  # Integer variable for assignments
+    @variable(model, Y[p in P2, i in I_Y[p]] >= 0, Int)  # Integer variable for assignments, indexed by pattern number p ∈ P2
+    @variable(model, Z[p in P2, i in I_Z[p]] >= 0, Int)  # Integer variable for assignments, indexed by pattern number p ∈ P2
 
     # Objective: Minimize two-block patterns
     @objective(model, Min, sum(X[i] for i in 1:length(P) if pattern_types[i] == 2))
 
     # Constraint (4)): Total lanes must match l (should be v)
-    @constraint(model, total_lanes, sum(X[i] for i in 1:length(P)) == l + 17 + 3)
+    @constraint(model, total_lanes, sum(X[i] for i in 1:length(P)) == l + layout.extra_lanes)
+    count_constraints!("(4)")
 
     # Constraint (5): Satisfy total bus requirements per type
-    for t in bus_types
-        @constraint(model, sum((get(exit_block[i], t, 0) + get(entry_block[i], t, 0)) * X[i] for i in 1:length(P)) == b[t])
+    for k in 1:num_types
+        @constraint(model, sum((exit_size[i, k] + entry_size[i, k]) * X[i] for i in 1:length(P)) == b[k])
     end
+    count_constraints!("(5)")
 
-    # Add a constraint to ensure at least one pattern includes an exit block with exactly one bus of type 'SMV' 
-    
-    # Select H, I and J
-    #@constraint(model, 
-    #sum(X[i] for i in 1:length(P) if (get(exit_block[i], "DMV", 0) >= 1 || get(exit_block[i], "DMS", 0) >= 1) && (get(entry_block[i], "SMS", 0) >= 1 || get(entry_block[i], "SMV", 0) >= 1)) <= 3 + 0.001 
-    #)
-    #@constraint(model, 
-    #sum(X[i] for i in 1:length(P) if (get(exit_block[i], "DMV", 0) >= 1 || get(exit_block[i], "DMS", 0) >= 1) && (get(entry_block[i], "SMS", 0) >= 1 || get(entry_block[i], "SMV", 0) >= 1)) >= 3 - 0.001
-    #)
-    # Select H, I and J
-    # Select H, I and J
-    @constraint(model, 
-    sum(X[i] for i in 1:length(P) if (get(exit_block[i], "DMV", 0) == 1 || get(exit_block[i], "DMS", 0) == 1) && (get(entry_block[i], "SMV", 0) >= 1)) <= 1 + 0.001 
-    )
-    @constraint(model, 
-    sum(X[i] for i in 1:length(P) if (get(exit_block[i], "DMV", 0) == 1 || get(exit_block[i], "DMS", 0) == 1) && (get(entry_block[i], "SMV", 0) >= 1)) >= 1 - 0.001
-    )
-
-
-    @constraint(model, 
-    sum(X[i] for i in 1:length(P) if (get(exit_block[i], "DMV", 0) == 1 || get(exit_block[i], "DMS", 0) == 1) && (get(entry_block[i], "SMS", 0) >= 1)) <= 1 + 0.001 
-    )
-    @constraint(model, 
-    sum(X[i] for i in 1:length(P) if (get(exit_block[i], "DMV", 0) == 1 || get(exit_block[i], "DMS", 0) == 1) && (get(entry_block[i], "SMS", 0) >= 1)) >= 1 - 0.001
-    )
-    
-
-    @constraint(model, 
-    sum(X[i] for i in 1:length(P) if (get(exit_block[i], "DMV", 0) == 5 || get(exit_block[i], "DMS", 0) == 5) && (get(entry_block[i], "SMS", 0) >= 1 || get(entry_block[i], "SMV", 0) >= 1)) <= 1 + 0.001 
-    )
-    @constraint(model, 
-    sum(X[i] for i in 1:length(P) if (get(exit_block[i], "DMV", 0) == 5 || get(exit_block[i], "DMS", 0) == 5) && (get(entry_block[i], "SMS", 0) >= 1 || get(entry_block[i], "SMV", 0) >= 1)) >= 1 - 0.001
-    )
-
-    # G, K and L
-    @constraint(model, 
-    sum(X[i] for i in 1:length(P) if ((get(exit_block[i], "DMV", 0) >= 1 || get(exit_block[i], "DMS", 0) >= 1) && (get(entry_block[i], "DMS", 0) >= 1 || get(entry_block[i], "DMV", 0) >= 1)) || get(exit_block[i], "DMS", 0)==6 || get(exit_block[i], "DMV", 0)==6) <= 3 + 0.001
-    )
-    @constraint(model, 
-    sum(X[i] for i in 1:length(P) if ((get(exit_block[i], "DMV", 0) >= 1 || get(exit_block[i], "DMS", 0) >= 1) && (get(entry_block[i], "DMS", 0) >= 1 || get(entry_block[i], "DMV", 0) >= 1)) || get(exit_block[i], "DMS", 0)==6 || get(exit_block[i], "DMV", 0)==6) >= 3 - 0.001
-    )
-    #B, C, D, E and F (Telit)
-    @constraint(model,
-    sum(X[i] for i in 1:length(P) if (get(exit_block[i], "SMS", 0) >= 1 || get(exit_block[i], "SMV", 0) >= 1) && (get(entry_block[i], "STS", 0) == 1 || get(entry_block[i], "STV", 0) == 1)) <= 5 + 0.001 
-    )
-    @constraint(model,
-    sum(X[i] for i in 1:length(P) if (get(exit_block[i], "SMS", 0) >= 1 || get(exit_block[i], "SMV", 0) >= 1) && (get(entry_block[i], "STS", 0) == 1 || get(entry_block[i], "STV", 0) == 1)) >= 5 - 0.001
-    )
-    # A
-    #@constraint(model,
-    #sum(X[i] for i in 1:length(P) if (get(exit_block[i], "SMS", 0) >= 1 || get(exit_block[i], "SMV", 0) >= 1) && (get(entry_block[i], "SMS", 0) >= 0 || get(entry_block[i], "SMV", 0) >= 0)) <= 1 + 0.001
-    #)
-    #@constraint(model,
-    #sum(X[i] for i in 1:length(P) if (get(exit_block[i], "SMS", 0) >= 1 || get(exit_block[i], "SMV", 0) >= 1) && (get(entry_block[i], "SMS", 0) >= 0 || get(entry_block[i], "SMV", 0) >= 0)) >= 1 - 0.001
-    #)
+    # Side constraints of the depot layout (H, I and J, G, K and L, B-F)
+    for side in layout.side_constraints
+        @constraint(model,
+        sum(X[i] for i in 1:length(P) if any(rule -> pattern_matches(view(exit_size, i, :), view(entry_size, i, :), bus_types, rule), side.patterns)) == side.lanes
+        )
+    end
+    count_constraints!("side")
 
+    # Outside spots
     @constraint(model,
-    sum(X[i] for i in length(P)-4:length(P)-2) <= 17 + 0.001
+    sum(X[i] for i in outside_columns) == layout.outside_spots
     )
-    @constraint(model,
-    sum(X[i] for i in length(P)-4:length(P)-2) >= 17 - 0.001
-    )
-
-    #@constraint(model,
-    #sum(X[i] for i in length(P)-1:length(P)) <= 4 + 0.001
-    #)
-    #@constraint(model,
-    #sum(X[i] for i in length(P)-1:length(P)) >= 4 - 0.001
-    #)
-    
-    # Constraint (6)
-    for t in bus_types
-        for i in indices_high[t]  # Loop through indices for each bus type
-            @constraint(model, 
-                sum(get(exit_block[p], t, 0) * X[p] for p in 1:length(P)) +
-                sum(get(entry_block[p], t, 0) * Y[p, i] for p in 1:length(P) if pattern_types[p] == 2)
-                >= a_high[t][i]  # Access a_high dictionary correctly for the specific bus type and index
-            )
+    count_constraints!("outside")
+
+    # Positions of (7) and (11) for each bus type: the indices of all other bus types
+    others_low = [union([indices_low[k′] for k′ in 1:num_types if k′ ≠ k]...) for k in 1:num_types]
+    others_departed = [union([departure_indices[k′] for k′ in 1:num_types if k′ ≠ k]...) for k in 1:num_types]
+
+    # Leave out the rows of (7) and (11) implied by the others
+    kept_low = undominated_positions(others_low, a_low, b)
+    kept_departed = undominated_positions(others_departed, no_of_departed, b)
+    dominated_rows = Dict("(7)" => sum(length, others_low) - sum(length, kept_low),
+                          "(11)" => sum(length, others_departed) - sum(length, kept_departed))
+    println("Dominated rows left out: $(dominated_rows["(7)"]) of (7) and $(dominated_rows["(11)"]) of (11)")
+    others_low, others_departed = kept_low, kept_departed
+
+    if matrix_constraints
+        add_matrix_constraints!(model, X, Y, Z, P2, I_Y, I_Z, n, exit_size, entry_size,
+                                indices_high, a_high, others_low, a_low,
+                                departure_indices, no_of_departed, others_departed, count_constraints!)
+    else
+        # Constraint (6)
+        for k in 1:num_types
+            for i in indices_high[k]  # Loop through indices for each bus type
+                @constraint(model,
+                    sum(exit_size[p, k] * X[p] for p in 1:length(P)) +
+                    sum(entry_size[p, k] * Y[p, i] for p in P2 if entry_size[p, k] > 0)
+                    >= a_high[k, i]
+                )
+            end
         end
-    end
-
-    # Constraint (7)
-    for t in bus_types
-        for i in union([indices_low[t′] for t′ in bus_types if t′ ≠ t]...)  # Collect indices from all other bus types
-            @constraint(model, 
-                sum(get(exit_block[p], t, 0) * Y[p, i] for p in 1:length(P) if pattern_types[p] == 2)
-                <= a_low[t][i]  # Access a_low dictionary correctly for the specific bus type and index
-            )
+        count_constraints!("(6)")
+
+        # Constraint (7)
+        for k in 1:num_types
+            for i in others_low[k]  # Indices from all other bus types
+                @constraint(model,
+                    sum(exit_size[p, k] * Y[p, i] for p in P2 if exit_size[p, k] > 0)
+                    <= a_low[k, i]
+                )
+            end
         end
-    end
+        count_constraints!("(7)")
 
-    # Constraint (8)
-    for (idx, p) in enumerate(P)  # idx is the position in P, p is the value in P
-        if pattern_types[idx] == 2
-            for i in 1:n-1
-                @constraint(model, Y[idx, i] <= Y[idx, i+1])
+        # Constraint (8)
+        for idx in P2  # idx is the position in P
+            for (i, next) in zip(I_Y[idx][1:end-1], I_Y[idx][2:end])
+                @constraint(model, Y[idx, i] <= Y[idx, next])
             end
         end
-    end
+        count_constraints!("(8)")
 
-    # Constraint (9)
-    for (idx, p) in enumerate(P)  # idx is the position in P, p is the value in P
-        if pattern_types[idx] == 2
-            @constraint(model, Y[idx, n] <= X[idx])
+        # Constraint (9)
+        for idx in P2
+            @constraint(model, Y[idx, last(I_Y[idx])] <= X[idx])
         end
-    end
+        count_constraints!("(9)")
+
+        # Constraint (10)
+        for k in 1:num_types
+            for i in departure_indices[k]  # Loop through indices for each bus type
+                @constraint(model,
+                    sum(exit_size[p, k] * X[p] for p in 1:length(P)) +
+                    sum(entry_size[p, k] * Z[p, i] for p in P2 if entry_size[p, k] > 0)
+                    >= no_of_departed[k, i]
+                )
+            end
+        end
+        count_constraints!("(10)")
+
+        # Constraint (11)
+        for k in 1:num_types
+            for i in others_departed[k]  # Indices from all other bus types
+                @constraint(model,
+                    sum(exit_size[p, k] * Z[p, i] for p in P2 if exit_size[p, k] > 0)
+                    <= no_of_departed[k, i]
+                )
+            end
+        end
+        count_constraints!("(11)")
 
-    # Constraint (10)
-    for t in bus_types
-        for i in departure_indices[t]  # Loop through indices for each bus type
-            @constraint(model, 
-                sum(get(exit_block[p], t, 0) * X[p] for p in 1:length(P)) +
-                sum(get(entry_block[p], t, 0) * Z[p, i] for p in 1:length(P) if pattern_types[p] == 2)
-                >= no_of_departed[t][i]  # Access a_high dictionary correctly for the specific bus type and index
-            )
+        # Constraint (12)
+        for idx in P2  # idx is the position in P
+            for (j, next) in zip(I_Z[idx][1:end-1], I_Z[idx][2:end])
+                @constraint(model, Z[idx, j] <= Z[idx, next])
+            end
         end
-    end
+        count_constraints!("(12)")
 
-    # Constraint (11)
-    for t in bus_types
-        for i in union([departure_indices[t′] for t′ in bus_types if t′ ≠ t]...)  # Collect indices from all other bus types
-            @constraint(model, 
-                sum(get(exit_block[p], t, 0) * Z[p, i] for p in 1:length(P) if pattern_types[p] == 2)
-                <= no_of_departed[t][i]  # Access a_low dictionary correctly for the specific bus type and index
-            )
+        # Constraint (13)
+        for idx in P2
+            @constraint(model, Z[idx, last(I_Z[idx])] <= X[idx])
         end
+        count_constraints!("(13)")
     end
 
-    # Constraint (12)
-    for (idx, p) in enumerate(P)  # idx is the position in P, p is the value in P
-        if pattern_types[idx] == 2
-            for j in 1:n-1
-                @constraint(model, Z[idx, j] <= Z[idx, j+1])
+    # Warm start from an earlier solution: a Dict with "X", "Y", "Z" and "P" as returned at the end,
+    # e.g. the previous night. Patterns are matched by content since their numbering depends on the
+    # order of the bus types, Y and Z are only used when the number of buses is the same.
+    if start !== nothing
+        start_P = [[(String(t), Int(s)) for (t, s) in pattern] for pattern in start["P"]]
+        start_index = Dict(pattern => k for (k, pattern) in enumerate(start_P))
+        start_row = Dict(pattern => r for (r, pattern) in enumerate(filter(pattern -> length(pattern) == 2, start_P)))
+        for p in 1:length(P)
+            k = get(start_index, P[p], nothing)
+            set_start_value(X[p], k === nothing ? 0.0 : round(start["X"][k]))
+        end
+        for p in P2
+            r = get(start_row, P[p], nothing)
+            for (V, positions, values) in ((Y, I_Y[p], start["Y"]), (Z, I_Z[p], start["Z"]))
+                if r === nothing
+                    foreach(i -> set_start_value(V[p, i], 0.0), positions)
+                elseif length(values[r]) == n
+                    foreach(i -> set_start_value(V[p, i], round(values[r][i])), positions)
+                end
             end
         end
+        println("Warm start from $(count(p -> haskey(start_index, p), P)) of $(length(P)) patterns")
     end
 
-    # Constraint (13)
-    for (idx, p) in enumerate(P)  # idx is the position in P, p is the value in P
-        if pattern_types[idx] == 2
-            @constraint(model, Z[idx, n] <= X[idx])
-        end
+    time_limit === nothing || set_time_limit_sec(model, time_limit)
+    mip_gap === nothing || set_optimizer_attribute(model, "mip_rel_gap", mip_gap)
+
+    # Report improved solutions while solving, the callback is set on the HiGHS instance itself
+    on_incumbent_ref = Ref{Any}(on_incumbent)
+    if on_incumbent !== nothing
+        MOI.Utilities.attach_optimizer(model)
+        highs = unsafe_backend(model)
+        callback = @cfunction(incumbent_callback, Cvoid,
+            (Cint, Ptr{Cchar}, Ptr{HiGHS.HighsCallbackDataOut}, Ptr{HiGHS.HighsCallbackDataIn}, Ptr{Cvoid}))
+        HiGHS.Highs_setCallback(highs, callback, pointer_from_objref(on_incumbent_ref))
+        HiGHS.Highs_startCallback(highs, HiGHS.kHighsCallbackMipImprovingSolution)
     end
 
-    optimize!(model)
+    build_time = time() - build_start
+    GC.@preserve on_incumbent_ref optimize!(model)
+
+    status = solution_status(model)
+    println("Solver status: $status ($(termination_status(model)) after $(round(solve_time(model), digits=1)) s)")
+    solved = status == "OPTIMAL" || status == "FEASIBLE"
+
+    # Model size and where the time went, logged by the Python drivers
+    stats = Dict(
+        "buses" => n,
+        "patterns" => length(P),
+        "two_block_patterns" => length(P2),
+        "variables" => Dict("X" => length(X), "Y" => length(Y), "Z" => length(Z)),
+        "constraints" => constraint_counts,
+        "dominated_rows" => dominated_rows,
+        "build_time" => build_time,
+        "solve_time" => solve_time(model),
+        "nodes" => node_count(model),
+        "gap" => solved ? finite_or_nothing(relative_gap(model)) : nothing,
+    )
+
+    if !solved
+        return Float64[], zeros(Int16, 0, n), zeros(Int16, 0, n), P, status, stats
+    end
+    println("Objective: $(objective_value(model)), bound: $(objective_bound(model)), gap: $(relative_gap(model))")
 
     #println("")
     #println("Variable X (values represent the number of lanes partitioned according to pattern *index number of X*):")
@@ -399,26 +676,46 @@ function optimize_model_k_approach(l::Int, v::Int, max_deviation::Int, arrivals,
 
     println("")
     println("Total buses assigned across all patterns:")
-    total_buses_assigned = sum((get(exit_block[i], t, 0) + get(entry_block[i], t, 0)) * JuMP.value(X[i]) for i in 1:length(P), t in bus_types)
+    total_buses_assigned = sum((exit_size[i, k] + entry_size[i, k]) * JuMP.value(X[i]) for i in 1:length(P), k in 1:num_types)
     println(total_buses_assigned)
-    println("Expected total buses: ", sum(values(b)))
+    println("Expected total buses: ", sum(b))
 
     # Print the selected patterns
     println("")
     println("Selected Patterns:")
     for i in 1:length(P)
         if JuMP.value(X[i]) > 0
-            println("Pattern $i: ", P[i], " - Type: ", pattern_types[i], " - Exit block: ", exit_block[i], " - Entry block: ", entry_block[i], " - Count: ", JuMP.value(X[i]))
+            println("Pattern $i: ", P[i], " - Type: ", pattern_types[i], " - Count: ", JuMP.value(X[i]))
         end
     end
 
     #println("Number of patterns with 'STS' in entry block selected:")
-    #println(sum(JuMP.value(X[i]) for i in 1:length(P) if get(entry_block[i], "STS", 0) == 1))
+    #println(sum(JuMP.value(X[i]) for i in 1:length(P) if entry_size[i, findfirst(==("STS"), bus_types)] == 1))
 
     #println("Number of patterns with 'DMV' in exit block selected:")
-    #println(sum(JuMP.value(X[i]) for i in 1:length(P) if get(exit_block[i], "DMV", 0) == 1))
+    #println(sum(JuMP.value(X[i]) for i in 1:length(P) if exit_size[i, findfirst(==("DMV"), bus_types)] == 1))
+
+
 
+    # Y or Z as a plain (|P2| x n) Int16 matrix, row r belongs to pattern P[P2[r]]. A position without
+    # a variable gets the value of the previous event position (0 before the first one), which
+    # keeps (8)-(9) and (12)-(13) satisfied over all positions.
+    function position_values(V, positions)
+        values = zeros(Int16, length(P2), n)
+        for (r, p) in enumerate(P2)
+            k = 0
+            for i in 1:n
+                if k < length(positions[p]) && positions[p][k+1] == i
+                    k += 1
+                end
+                values[r, i] = k == 0 ? 0 : round(Int16, JuMP.value(V[p, positions[p][k]]))
+            end
+        end
+        return values
+    end
 
+    Y_values = position_values(Y, I_Y)
+    Z_values = position_values(Z, I_Z)
 
-    return JuMP.value.(X), JuMP.value.(Y), JuMP.value.(Z), P
-end
\ No newline at end of file
+    return JuMP.value.(X), Y_values, Z_values, P, status, stats
+end
@@ -1,8 +1,9 @@
 import numpy as np
 from copy import copy
+from timetable import MINUTES_PER_DAY
 
 class Lane:
-    def __init__(self, pattern, name):
+    def __init__(self, pattern, name, types):
         self.blocks = pattern # List of length two of tuples (bus_type, block_size), first element is exit block, second is entry block
         self.name = name # A, B, ..., K or L, or then number for ulkopaikat 
         self.type = len(pattern) == 1 # Boolean, true for one block patterns
@@ -12,6 +13,10 @@ class Lane:
 
         self.entry_type = None if self.type else self.blocks[1][0]
         self.entry_size = 0 if self.type else self.blocks[1][1]
+
+        # Type codes of the blocks in types (WeekTimetable.types), the parking loops compare these
+        self.exit_code = types.index(self.exit_type)
+        self.entry_code = None if self.type else types.index(self.entry_type)
         
         self.length = self.exit_size + self.entry_size # Length of the lane
         self.outside_parking = self.length == 1 # Boolean
@@ -21,15 +26,44 @@ class Lane:
         return
 
 
-def parking(lanes, arrivals, Y, P):
+def lanesFromSolution(X, P, types):
+    """
+    Lanes of the solution, round(X[i]) lanes with pattern P[i] for every selected pattern.
+
+    types: Bus type of each type code, WeekTimetable.types.
+
+    Returns a list of Lane objects named by their pattern index.
+    """
+    lanes = []
+    for i, pat in enumerate(P):
+        if X[i] > 0.99:
+            for j in range(round(X[i])):
+                lanes.append(Lane(pat, i, types))
+    return lanes
+
+
+def twoBlockRows(P):
+    """
+    Row of each two-block pattern in Y and Z, the model only has variables for those.
+
+    P: List of all patterns generated by the first optimization model.
+
+    Returns a dict from pattern, as a tuple of (bus_type, block_size) tuples, to its row.
+    """
+    P2 = [p for p in P if len(p) == 2]
+    return {tuple(p): row for row, p in enumerate(P2)}
+
+
+def parking(lanes, arrivals, Y, P, arrival_types):
     """
     Assigns arriving buses to available lanes based on their order of arrival.
 
     Parameters:
     lanes (list of Lane): A list of Lane objects, each representing a lane with specific patterns and attributes.
     arrivals (list): A list of arriving buses e.g. ["DMV429", ...], where each element represents the type of bus arriving.
-    Y: One of the parameters from the first optimization model.
+    Y: One of the parameters from the first optimization model, one row per two-block pattern.
     P: List of all patterns generated by the first optimization model.
+    arrival_types: Type code of each arriving bus, the same codes as Lane.exit_code.
 
     Returns:
     dict: A mapping of Lane objects to lists of tuples (List[Bus], block_size), exit and entry block
@@ -42,20 +76,22 @@ def parking(lanes, arrivals, Y, P):
     mapping = {lane: {"exitBlock": [], "exitSize": 0, "entryBlock": [], "entrySize": 0} for lane in lanes}
 
     # TODO: Sort list of lanes according to paper
-    types = list({lane.exit_type for lane in lanes}) # Set of all bus types in exit blocks
+    typeNames = {lane.exit_code: lane.exit_type for lane in lanes}
+    types = list(typeNames) # Set of all bus type codes in exit blocks
 
     # Dictionary of type to list of lanes with that type as the type of exit block
     # where the list of lanes is sorted according to Hamdouni et al. 2006
     lanes_copy = copy(lanes)
+    rows = twoBlockRows(P)
     
     L = {t: [] for t in types}
 
     for t in types:
         # Set of two block patterns of, where exit type is of type t
-        Pt = [lane.blocks for lane in lanes if lane.exit_type == t and not lane.type]
+        Pt = [lane.blocks for lane in lanes if lane.exit_code == t and not lane.type]
         mts = [0]
         for i in I:
-            mti = sum(Y[P.index(p)][i] for p in Pt) # p =  [("DMV", 5), ("STS", 1)]
+            mti = sum(Y[rows[tuple(p)]][i] for p in Pt) # p =  [("DMV", 5), ("STS", 1)]
             mts.append(mti)
         
         indexes = []
@@ -67,7 +103,7 @@ def parking(lanes, arrivals, Y, P):
 
         for i in indexes:
             for p in Pt:
-                for j in range(0, round(Y[P.index(p)][i - 1]) - round(Y[P.index(p)][i - 2])):
+                for j in range(0, round(Y[rows[tuple(p)]][i - 1]) - round(Y[rows[tuple(p)]][i - 2])):
                     for k, lane in enumerate(lanes_copy):
                         if lane.blocks == p:
                             lanes_copy.pop(k)
@@ -76,20 +112,19 @@ def parking(lanes, arrivals, Y, P):
 
     # Rest should be one block lanes
     for lane in lanes_copy:
-        t = lane.exit_type
+        t = lane.exit_code
         L[t].append(lane)
 
     for t in types:
         print("--------------")
-        print("Type: ", t)
+        print("Type: ", typeNames[t])
         for lane in L[t]:
             lane.__str__()
         print("\n")
 
 
-    for arrival in arrivals:
+    for arrival, t in zip(arrivals, np.asarray(arrival_types).tolist()):
         done = False
-        t = arrival[:3]
         for lane in L[t]:
             # If this lane has a two block pattern, where exit block is of the correct type and it is not full, park here
             if not lane.type and mapping[lane]["exitSize"] < lane.exit_size:
@@ -97,13 +132,13 @@ def parking(lanes, arrivals, Y, P):
                 mapping[lane]["exitBlock"].append(arrival)
                 mapping[lane]["exitSize"] += 1
                 done = True
-                assert t == lane.exit_type
+                assert t == lane.exit_code
                 break # Stop scanning other lanes for this bus
         
         if not done:
             for lane in L[t]:
                 # Else if this is a one block pattern, where exit block is of the correct type and it is not full, park here
-                if lane.type and arrival[:3] == lane.exit_type and mapping[lane]["exitSize"] < lane.exit_size:
+                if lane.type and t == lane.exit_code and mapping[lane]["exitSize"] < lane.exit_size:
                     # Increment the number of busses in this lane and append the bus to the list of busses in this lane
                     mapping[lane]["exitBlock"].append(arrival)
                     mapping[lane]["exitSize"] += 1
@@ -114,7 +149,7 @@ def parking(lanes, arrivals, Y, P):
         # where the entry block is of the correct type and is not full, park here.
         if not done:
             for lane in lanes:
-                if not lane.type and t == lane.entry_type and mapping[lane]["entrySize"] < lane.entry_size:
+                if not lane.type and t == lane.entry_code and mapping[lane]["entrySize"] < lane.entry_size:
                     # Increment the number of busses in this lane and append the bus to the list of busses in this lane
                     mapping[lane]["entryBlock"].append(arrival)
                     mapping[lane]["entrySize"] += 1
@@ -144,13 +179,14 @@ def parking(lanes, arrivals, Y, P):
     return mapping, parkingWithID 
 
 
-def dispatching(lanes, mapping, departures, Z, P):
+def dispatching(lanes, mapping, departures, Z, P, departure_types):
     """
     Assigns arriving buses to available lanes based on their order of arrival.
 
     Parameters:
     lanes (list of Lane): A list of Lane objects, each representing a lane with specific patterns and attributes.
     departures (list): A list of planned leaving buses in ascending order e.g. ["DMV501", "DMV505", ...], where each element represents the type of bus departuring.
+    departure_types: Type code of each departing bus, the same codes as Lane.exit_code.
 
     Returns:
     dict: A mapping of Lane objects to lists of tuples (List[Bus], block_size), exit and entry block
@@ -165,20 +201,22 @@ def dispatching(lanes, mapping, departures, Z, P):
     departuresWithID = {lane: [] for lane in lanes}
 
     # TODO: Sort list of lanes according to paper
-    types = list({lane.exit_type for lane in lanes}) # Set of all bus types in exit blocks
+    typeNames = {lane.exit_code: lane.exit_type for lane in lanes}
+    types = list(typeNames) # Set of all bus type codes in exit blocks
 
     # Dictionary of type to list of lanes with that type as the type of exit block
     # where the list of lanes is sorted according to Hamdouni et al. 2006
     lanes_copy = copy(lanes)
+    rows = twoBlockRows(P)
     
     L = {t: [] for t in types}
 
     for t in types:
         # Set of two block patterns of, where exit type is of type t
-        Pt = [lane.blocks for lane in lanes if lane.exit_type == t and not lane.type]
+        Pt = [lane.blocks for lane in lanes if lane.exit_code == t and not lane.type]
         mts = [0]
         for i in I:
-            mti = sum(Z[P.index(p)][i] for p in Pt) # p =  [("DMV", 5), ("STS", 1)]
+            mti = sum(Z[rows[tuple(p)]][i] for p in Pt) # p =  [("DMV", 5), ("STS", 1)]
             mts.append(mti)
         
         indexes = []
@@ -190,7 +228,7 @@ def dispatching(lanes, mapping, departures, Z, P):
 
         for i in indexes:
             for p in Pt:
-                for j in range(0, round(Z[P.index(p)][i-1]) - round(Z[P.index(p)][i - 2])):
+                for j in range(0, round(Z[rows[tuple(p)]][i-1]) - round(Z[rows[tuple(p)]][i - 2])):
                     for k, lane in enumerate(lanes_copy):
                         if lane.blocks == p:
                             lanes_copy.pop(k)
@@ -198,23 +236,22 @@ def dispatching(lanes, mapping, departures, Z, P):
 
     # Rest should be one block lanes
     for lane in lanes_copy:
-        t = lane.exit_type
+        t = lane.exit_code
         L[t].append(lane)
 
     for t in types:
         print("--------------")
-        print("Type: ", t)
+        print("Type: ", typeNames[t])
         for lane in L[t]:
             lane.__str__()
         print("\n")
 
 
-    for departure in departures:
+    for departure, t in zip(departures, np.asarray(departure_types).tolist()):
         done = False
-        t = departure[:3]
         for lane in L[t]:
             # First prioritize two block pattern lane with non-empty exit block with correct type
-            if not lane.type and mapping[lane]["exitSize"] > 0 and lane.exit_type == departure[:3]:
+            if not lane.type and mapping[lane]["exitSize"] > 0 and lane.exit_code == t:
                 eilisenAutoKierto = mapping[lane]["exitBlock"].pop(0) # Eilisen autokierto ID
                 mapping[lane]["exitSize"] -= 1
                 departuresWithID[lane].append(departure)
@@ -225,7 +262,7 @@ def dispatching(lanes, mapping, departures, Z, P):
         if not done:
             for lane in L[t]:
                 # Then one block pattern with non-empty exit block with correct type
-                if lane.type and mapping[lane]["exitSize"] > 0 and lane.exit_type == departure[:3]:
+                if lane.type and mapping[lane]["exitSize"] > 0 and lane.exit_code == t:
                     eilisenAutoKierto = mapping[lane]["exitBlock"].pop(0)
                     mapping[lane]["exitSize"] -= 1
                     departuresWithID[lane].append(departure)
@@ -235,7 +272,7 @@ def dispatching(lanes, mapping, departures, Z, P):
         if not done:
             for lane in lanes:
                 # Lastly two block pattern lane with non-empty entry blcok with correct type
-                if not lane.type and mapping[lane]['exitSize'] == 0 and mapping[lane]["entrySize"] > 0 and lane.entry_type == departure[:3]:
+                if not lane.type and mapping[lane]['exitSize'] == 0 and mapping[lane]["entrySize"] > 0 and lane.entry_code == t:
                     eilisenAutoKierto = mapping[lane]["entryBlock"].pop(0)
                     mapping[lane]["entrySize"] -= 1
                     departuresWithID[lane].append(departure)
@@ -252,9 +289,37 @@ def dispatching(lanes, mapping, departures, Z, P):
             
     return departuresWithID
 
-def adjustDeparture(busses, day):
+def adjustedDepartures(week):
     """
-        busses: List of bus objects
+        Departure after each of the five nights for every bus, with missing departures
+        replaced by the next available departure of the week plus 24 hours per skipped day.
+
+        week: WeekTimetable of the buses
+
+        Returns (departures, missing), both of shape (n_buses x 5) in the night order
+        "make", "to", "pe", "la", "su". A departure is only replaced if the bus arrives
+        on that night, otherwise it stays missing.
+    """
+    departures = week.times[:, 1::2] # Departures of nights make ... su are the odd columns
+    nones = week.missing[:, 1::2]
+    arrival_missing = week.missing[:, 0::2]
+
+    # Night k looks at the departures of the nights k + 1, ..., k + 4 (mod 5), nearest first
+    offsets = np.arange(1, 5)
+    nights = (np.arange(5)[:, None] + offsets[None, :]) % 5
+    candidates = departures[:, nights] + offsets * MINUTES_PER_DAY
+    available = ~nones[:, nights]
+
+    first = available.argmax(axis=2)
+    nextDeparture = np.take_along_axis(candidates, first[..., None], axis=2)[..., 0]
+    fill = nones & available.any(axis=2) & ~arrival_missing
+
+    return np.where(fill, nextDeparture, departures), nones & ~fill
+
+
+def adjustDeparture(week, day):
+    """
+        week: WeekTimetable of the buses
         day: "make", "to", "pe", "la", or "su", the night which we are looking at parking
     """
 
@@ -262,46 +327,11 @@ def adjustDeparture(busses, day):
 
     indexOfDay = weekDays.index(day)
 
-    for bus in busses:
-        arrivalDepartureDict = [bus.departure_time_TITO, 
-                                bus.departure_time_PE, 
-                                bus.departure_time_LA, 
-                                bus.departure_time_SU, 
-                                bus.departure_time_MA
-                               ]
+    departures, nones = adjustedDepartures(week)
 
-        if arrivalDepartureDict[indexOfDay] is None:
-            idx = indexOfDay + 1
-            nones = [arrivalDepartureDict[i] is None for i in range(5)]
-
-            prev = nones[indexOfDay]
-            j = -1
-            
-            while True:
-                curr = nones[idx % 5]
-                if prev == 1 and curr == 0:
-                    j = idx #
-                    break
-
-                prev = curr
-                idx += 1
-                if idx % 5 == indexOfDay:
-                    break
+    for row in np.flatnonzero(week.missing[:, 1::2].all(axis=1)):
+        print("Exception :D")
 
-            if j != -1:
-                if indexOfDay == 0 and bus.arrival_time_MAKE is not None:
-                    bus.departure_time_TITO = arrivalDepartureDict[j % 5] + (j - indexOfDay) * 24.0
-                elif indexOfDay == 1 and bus.arrival_time_TO is not None:
-                    bus.departure_time_PE = arrivalDepartureDict[j % 5] + (j - indexOfDay) * 24.0
-                elif indexOfDay == 2 and bus.arrival_time_PE is not None:
-                    bus.departure_time_LA = arrivalDepartureDict[j % 5] + (j - indexOfDay) * 24.0
-                elif indexOfDay == 3 and bus.arrival_time_LA is not None:
-                    bus.departure_time_SU = arrivalDepartureDict[j % 5] + (j - indexOfDay) * 24.0
-                elif indexOfDay == 4 and bus.arrival_time_SU is not None:
-                    bus.departure_time_MA = arrivalDepartureDict[j % 5] + (j - indexOfDay) * 24.0
-
-            else:
-                print("Exception :D")
-        else:
-            continue
-    return busses
\ No newline at end of file
+    week.times[:, 2 * indexOfDay + 1] = departures[:, indexOfDay]
+    week.missing[:, 2 * indexOfDay + 1] = nones[:, indexOfDay]
+    return week
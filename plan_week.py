@@ -0,0 +1,183 @@
+import contextlib
+import copy
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import LA
+import MAKE
+import PE
+import TO
+import julia_solver
+from excel_fill import fill_departures_to_excel, fill_arrivals_to_excel
+from parking_busses import adjustDeparture, dispatching, lanesFromSolution, parking
+from timetable import NIGHTS, load_week
+
+
+# Koko viikon suunnittelu yhdellä ajolla: viikko luetaan kerran ja yöt ratkaistaan rinnakkain.
+# Usage: python plan_week.py [make to pe la su]
+
+FILE_PATHS = [
+    "data/KAJSYK24_MA-TO.xlsx",
+    "data/KAJSYK24_PE.xlsx",
+    "data/KAJSYK24_LA.xlsx",
+    "data/KAJSYK24_SU.xlsx",
+    "data/KAJSYK24_MA-TO.xlsx",
+]
+
+# Depot and model parameters, the same on every night
+l = 12  # Number of lanes
+v = 6  # Total number of bus slots
+max_deviation = 5
+
+# "julia" for the Julia solver processes, one per night, or "highs" for highs_solver.py
+ENGINE = os.environ.get("K_POSITION_ENGINE", "julia")
+
+
+def su_instance(week):
+    """
+    SU night (arrivals on SU, departures on MA). There is no script of its own for it,
+    so it is built like the PE and LA nights and solved with the weekend rules. Only buses
+    that both arrive on SU and depart on MA are included, the rest stay parked since the weekend.
+    """
+    week.rename_type("SVV", "SMV")
+
+    # Näitä ei ole mallissa mukana ollenkaan, tulee tehdä käsin ja parkkeerata ulos
+    week = week.select(~week.starts_with(["DMV426", "DMV427", "DMV428", "DMV429"]))
+    week = adjustDeparture(week, "su")
+
+    rows = np.flatnonzero(week.has_times("arrival_time_SU", "departure_time_MA"))
+    arrivals_SU = week.order("arrival_time_SU", rows)
+    departures_MA = week.order("departure_time_MA", rows)
+
+    return (week.bus_ids[arrivals_SU].tolist(), week.type_codes[arrivals_SU],
+            week.bus_ids[departures_MA].tolist(), week.type_codes[departures_MA])
+
+
+# Night: (instance builder, depot layout, workbook that gets the lane assignments or None)
+NIGHT_SETTINGS = {
+    "make": (MAKE.night_instance, MAKE.DEPOT_LAYOUT, FILE_PATHS[0]),  # Like MAKE.py
+    "to": (TO.night_instance, TO.DEPOT_LAYOUT, None),
+    "pe": (PE.night_instance, PE.DEPOT_LAYOUT, None),
+    "la": (LA.night_instance, LA.DEPOT_LAYOUT, None),
+    "su": (su_instance, "LASU", None),
+}
+
+
+def night_socket(night):
+    """Socket of the Julia solver process of a night, each worker keeps its own process warm."""
+    return os.path.join(tempfile.gettempdir(), f"k_position_solver_{night}.sock")
+
+
+@contextlib.contextmanager
+def captured_stdout(output):
+    """Write stdout, also what the solver libraries print at the file descriptor level, to the file output."""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    os.dup2(output.fileno(), 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+def solve_night(night, arrivals, departures, types, start=None):
+    """
+    Solve one night in a worker process, arrivals and departures as type codes into types.
+    start is the warm start read by plan_week, the workers do not read or save solutions themselves.
+
+    Returns:
+        tuple: X, Y, Z, P, the status flag and the statistics, and what the solve printed.
+    """
+    layout = NIGHT_SETTINGS[night][1]
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as output:
+        with captured_stdout(output):
+            if ENGINE == "highs":
+                import highs_solver
+                solution = highs_solver.optimize_model(
+                    MAKE.MODEL_FILE, MAKE.MODEL_FUNCTION, l, v, max_deviation, arrivals, departures,
+                    layout=layout, compress_positions=MAKE.COMPRESS_POSITIONS, start=start,
+                    prune_patterns=MAKE.PRUNE_PATTERNS, time_limit=MAKE.TIME_LIMIT, mip_gap=MAKE.MIP_GAP, types=types,
+                )
+            else:
+                solution = julia_solver.optimize_model(
+                    MAKE.MODEL_FILE, MAKE.MODEL_FUNCTION, l, v, max_deviation, arrivals, departures,
+                    layout=layout, compress_positions=MAKE.COMPRESS_POSITIONS, start=start,
+                    prune_patterns=MAKE.PRUNE_PATTERNS, time_limit=MAKE.TIME_LIMIT, mip_gap=MAKE.MIP_GAP, types=types,
+                    socket_path=night_socket(night),
+                )
+        output.seek(0)
+        return solution, output.read()
+
+
+def plan_week(nights=NIGHTS, file_paths=FILE_PATHS, workers=None):
+    """
+    Read the week once, solve the nights in parallel and park and dispatch every night.
+
+    Args:
+        nights (list): Nights to plan, see timetable.NIGHTS.
+        file_paths (list): Timetable workbooks of the week.
+        workers (int): Worker processes, by default one per night.
+
+    Returns:
+        dict: Night to (parking, dispatching) lane mappings, for the nights that could be solved.
+    """
+    week = load_week(file_paths, MAKE.BUS_TYPE_MAPPING.keys())
+    print(f"Nro of buses: {len(week)}")
+
+    # Every night modifies its own copy of the week
+    instances = {}
+    for night in nights:
+        print(f"\n------------\nNight {night}")
+        instances[night] = NIGHT_SETTINGS[night][0](copy.deepcopy(week))
+
+    # The warm start is read once before the nights are solved and saved once after, so which plan
+    # starts which night does not depend on the timing of the worker processes
+    start = julia_solver.load_solution(l, v) if MAKE.WARM_START else None
+    last_solution = None
+
+    with ProcessPoolExecutor(max_workers=workers or len(nights)) as pool:
+        futures = {
+            night: pool.submit(solve_night, night, arrivals, departures, week.types, start)
+            for night, (for_parking, arrivals, for_dispatching, departures) in instances.items()
+        }
+
+        results = {}
+        for night, future in futures.items():
+            print(f"\n============\nNight {night}")
+            try:
+                (X, Y, Z, P, status, stats), output = future.result()
+            except Exception as err:
+                print(f"Night {night} could not be solved: {err}")
+                continue
+            print(output, end="")
+            julia_solver.log_stats(stats, night=night, l=l, v=v, layout=NIGHT_SETTINGS[night][1], status=status)
+            if status not in julia_solver.SOLVED_STATUSES:
+                print(f"No plan to park on night {night}, the solver stopped with status {status}")
+                continue
+            last_solution = X, Y, Z, P
+
+            for_parking, arrivals, for_dispatching, departures = instances[night]
+            lanes_list = lanesFromSolution(X, P, week.types)
+            buses_mapped, lanes_parking = parking(lanes_list, for_parking, Y, P, arrivals)
+            lanes_dispatching = dispatching(lanes_list, buses_mapped, for_dispatching, Z, P, departures)
+
+            workbook = NIGHT_SETTINGS[night][2]
+            if workbook is not None:
+                fill_departures_to_excel(workbook, lanes_dispatching)
+                fill_arrivals_to_excel(workbook, lanes_parking)
+            results[night] = (lanes_parking, lanes_dispatching)
+
+    # The last night solved in the order of nights starts the next run, as when running the night scripts in turn
+    if MAKE.WARM_START and last_solution is not None:
+        julia_solver.save_solution(l, v, *last_solution)
+    return results
+
+
+if __name__ == "__main__":
+    plan_week(sys.argv[1:] or NIGHTS)
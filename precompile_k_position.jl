@@ -0,0 +1,75 @@
+# Representative workload for build_sysimage.jl: solves a real MA-TO night and the pyjulia_test.py
+# instance through the same code path as the solver process.
+
+include(joinpath(@__DIR__, "solver_server.jl"))
+
+# Solve a request like the server does, the buffer stands in for a client to compile incumbent reporting
+precompile_solve(request) = solve(JSON.parse(JSON.json(request)), IOBuffer())
+
+# The response as a warm start, in the form julia_solver.py saves solutions (see save_solution)
+function start_from_response(response)
+    function dense_rows(triplets)
+        V = zeros(Int, triplets["shape"]...)
+        for (r, c, x) in zip(triplets["rows"], triplets["cols"], triplets["values"])
+            V[r+1, c+1] = x
+        end
+        return [V[r, :] for r in 1:size(V, 1)]
+    end
+    types = response["P"]["types"]
+    P = [entry_type < 0 ? [[types[exit_type+1], exit_size]] : [[types[exit_type+1], exit_size], [types[entry_type+1], entry_size]]
+         for (exit_type, exit_size, entry_type, entry_size) in response["P"]["table"]]
+    return Dict("X" => response["X"], "Y" => dense_rows(response["Y"]), "Z" => dense_rows(response["Z"]), "P" => P)
+end
+
+# The TO night of KAJSYK24 (TO.py) as type codes, like the night scripts send them. It is feasible,
+# so branch and bound, the incumbent callback, reading the solution and the warm start of the
+# second solve get compiled too, not only building the model.
+const TYPES = ["DMS", "DMV", "SMS", "SMV", "STS", "STV", "SVV"]  # WeekTimetable.types
+const NIGHT_ARRIVALS = split("""
+    DMV DMV DMV DMV DMV DMV DMV DMV DMV DMV DMV DMV STV DMV DMV DMV DMV DMV DMV STS STV DMV DMV
+    DMV DMV STV DMV STV SMS STV SMV STS SMV DMS SMV SMS SMS STV SMS SMS SMV SMS DMV SMS STV SMV
+    SMV DMV SMV DMS STS SMV SMV SMV STS SMS SMS STV SMV STV SMV STV SMS SMS SMS STV SMV SMV SMV
+    SMV SMV SMV STV SMV SMV STV SMV SMV SMV DMS SMV SMS SMS SMS STS SMS SMV SMS STS STS STV STS
+    """)
+const NIGHT_DEPARTURES = split("""
+    SMV SMV SMS SMS SMS SMV SMS SMV SMV SMV STS STV STV STS SMS SMV STS STS DMS SMV SMV STS SMS
+    SMV SMS SMS SMV SMV STS DMS SMS SMS STS STV SMV DMV STV DMV DMV DMV SMS SMV SMV STV DMS DMV
+    DMV SMV SMV STS STV SMV STV SMV SMV DMV SMV DMV DMV STV DMV DMV DMV DMV SMV SMV STV DMV DMV
+    DMV SMV SMS DMV SMS DMV DMV STV DMV SMS STV STV DMV SMS STV DMV DMV SMS STV DMV DMV SMS SMV
+    """)
+
+night_request = Dict(
+    "model" => "k_position_approach.jl",
+    "function" => "optimize_model_k_approach",
+    "args" => [12, 6, 5, [findfirst(==(t), TYPES) - 1 for t in NIGHT_ARRIVALS], [findfirst(==(t), TYPES) - 1 for t in NIGHT_DEPARTURES]],
+    "options" => Dict("layout" => "MATO", "compress_positions" => true, "prune_patterns" => true,
+                      "time_limit" => 120, "mip_gap" => 1e-4, "types" => TYPES),
+)
+response = precompile_solve(night_request)
+println("Precompile run of the MA-TO night: ", response["status"])
+if response["status"] in ("OPTIMAL", "FEASIBLE")
+    night_request["options"]["start"] = start_from_response(response)
+    println("Precompile run with a warm start: ", precompile_solve(night_request)["status"])
+end
+
+# Same instance as pyjulia_test.py, bus type names instead of codes
+l = 2  # Number of lanes
+v = 5  # Total number of bus slots
+max_deviation = 1
+arrivals = ["A", "A", "A", "B", "B", "A", "B", "C", "C", "C"]
+departures = ["A", "A", "A", "B", "B", "A", "B", "C", "C", "C"]
+
+for layout in ["MATO", "PELA", "LASU"]
+    request = Dict(
+        "model" => "k_position_approach.jl",
+        "function" => "optimize_model_k_approach",
+        "args" => [l, v, max_deviation, arrivals, departures],
+        "options" => Dict("layout" => layout, "time_limit" => 60),
+    )
+    # The depot side constraints make this small instance infeasible, which compiles that path
+    try
+        JSON.json(precompile_solve(request))
+    catch err
+        println("Precompile run of $layout: ", sprint(showerror, err))
+    end
+end
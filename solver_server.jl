@@ -0,0 +1,152 @@
+# Long-lived solver process for the night scripts (MAKE.py, TO.py, PE.py, LA.py).
+#
+# Loads the k-position model once, so JuMP, HiGHS and the model are compiled only on the
+# first solve of any night, and then answers requests from julia_solver.py over a Unix socket.
+#
+# Usage: julia --project=. solver_server.jl [socket path]   (packages pinned in Project.toml)
+# Start-up is much faster with the sysimage built by build_sysimage.jl, which julia_solver.py
+# picks up automatically.
+#
+# Protocol: one JSON object per line in each direction.
+#   request:  {"model": "k_position_approach.jl", "function": "optimize_model_k_approach",
+#              "args": [l, v, max_deviation, arrivals, departures],
+#              "options": {"layout": "LASU", "compress_positions": true, "time_limit": 300}}  (optional keyword arguments)
+#             arrivals and departures are bus type names, or 0-based type codes with the "types" option
+#             {"command": "ping"} or {"command": "shutdown"}
+#   response: {"X": [...], "Y": {"shape": [rows, n], "rows": [...], "cols": [...], "values": [...]}, "Z": {...},
+#              "P": {"types": ["DMV", "STS", ...], "table": [[0, 5, 1, 1], ...]},
+#              "status": "OPTIMAL", "stats": {"patterns": 160, ...}, "output": "what the model printed"}
+#             or {"error": "message"}
+#             X is rounded to integers. Y and Z have one row per two-block pattern, in the order those
+#             appear in P, and only their nonzeros are sent (0-based indices). Each pattern in P is a row
+#             [exit type, exit size, entry type, entry size] of 0-based codes into types, entry type -1
+#             for one-block patterns.
+#             While solving, every improved solution is sent ahead of the response as
+#             {"incumbent": {"objective": 8.0, "bound": 7.0, "elapsed": 1.2}}.
+
+using Sockets, JSON
+
+const MODEL_FILES = ["k_position_approach.jl"]
+
+# Each model file gets its own module, so model files cannot clash with each other or this file
+const MODELS = Dict{String, Module}()
+for file in MODEL_FILES
+    m = Module(Symbol(splitext(file)[1]))
+    Base.include(m, joinpath(@__DIR__, file))
+    MODELS[file] = m
+end
+
+# Run f with its stdout (including the HiGHS log) captured, return (result, output)
+function capture_output(f)
+    path, io = mktemp()
+    try
+        result = redirect_stdout(io) do
+            r = f()
+            Libc.flush_cstdio()
+            flush(stdout)
+            r
+        end
+        close(io)
+        return result, read(path, String)
+    finally
+        isopen(io) && close(io)
+        rm(path, force=true)
+    end
+end
+
+# The nonzeros of a matrix as COO triplets with 0-based indices, the size of the response
+# grows with the selected patterns instead of |P2| x n
+function nonzero_triplets(V)
+    nonzeros = findall(!iszero, V)
+    return Dict(
+        "shape" => collect(size(V)),
+        "rows" => [c[1] - 1 for c in nonzeros],
+        "cols" => [c[2] - 1 for c in nonzeros],
+        "values" => V[nonzeros],
+    )
+end
+
+# Patterns as rows of [exit type, exit size, entry type, entry size], types as 0-based codes
+function pattern_table(P)
+    types = unique(t for pattern in P for (t, _) in pattern)
+    code = Dict(t => k - 1 for (k, t) in enumerate(types))
+    table = [[code[pattern[1][1]], pattern[1][2],
+              length(pattern) == 2 ? code[pattern[2][1]] : -1, length(pattern) == 2 ? pattern[2][2] : 0]
+             for pattern in P]
+    return Dict("types" => types, "table" => table)
+end
+
+# Solve a request, improved solutions are streamed to client (if any) while solving
+function solve(request, client=nothing)
+    model = MODELS[request["model"]]
+    f = getfield(model, Symbol(request["function"]))
+    l, v, max_deviation, arrivals, departures = request["args"]
+    options = Dict{Symbol, Any}(Symbol(k) => value for (k, value) in get(request, "options", Dict()))
+    if client !== nothing
+        options[:on_incumbent] = function (objective, bound, elapsed)
+            finite(x) = isfinite(x) ? x : nothing  # No bound yet is -Inf, which JSON cannot hold
+            incumbent = Dict("objective" => finite(objective), "bound" => finite(bound), "elapsed" => elapsed)
+            println(client, JSON.json(Dict("incumbent" => incumbent)))
+            flush(client)
+        end
+    end
+
+    result, output = capture_output() do
+        f(Int(l), Int(v), Int(max_deviation), collect(arrivals), collect(departures); options...)
+    end
+    X, Y, Z, P, status, stats = result
+
+    return Dict(
+        "X" => round.(Int, X),
+        "Y" => nonzero_triplets(Y),
+        "Z" => nonzero_triplets(Z),
+        "P" => pattern_table(P),
+        "status" => status,
+        "stats" => stats,
+        "output" => output,
+    )
+end
+
+function serve(socket_path)
+    ispath(socket_path) && rm(socket_path)
+    server = listen(socket_path)
+    println("k-position solver listening on $socket_path")
+    flush(stdout)
+
+    running = true
+    while running
+        client = accept(server)
+        try
+            while isopen(client) && !eof(client)
+                request = JSON.parse(readline(client))
+                command = get(request, "command", "solve")
+                response = if command == "ping"
+                    Dict("ok" => true)
+                elseif command == "shutdown"
+                    running = false
+                    Dict("ok" => true)
+                else
+                    try
+                        solve(request, client)
+                    catch err
+                        Dict("error" => sprint(showerror, err))
+                    end
+                end
+                println(client, JSON.json(response))
+                running || break
+            end
+        catch err
+            println("Connection failed: ", sprint(showerror, err))
+        finally
+            close(client)
+        end
+    end
+
+    close(server)
+    rm(socket_path, force=true)
+end
+
+# Only serve when run as a script, precompile_k_position.jl includes this file for solve
+if abspath(PROGRAM_FILE) == @__FILE__
+    serve(length(ARGS) >= 1 ? ARGS[1] : joinpath(tempdir(), "k_position_solver.sock"))
+end
@@ -0,0 +1,515 @@
+import datetime
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+
+# Columns of the first sheet that the planning scripts use
+TIMETABLE_COLUMNS = ["Tunnus", "Lähtöaika", "Saapumisaika"]
+
+# Parsed day tables are stored here as .npz files, one per workbook content and prefix set
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+# Bump when the layout or the cleaning of the cached day tables changes
+CACHE_VERSION = 2
+
+# Times are stored as minutes since the start of the service day
+MINUTES_PER_DAY = 24 * 60
+
+# Workbook readers, see parse_day. "pandas" materializes the sheet with pd.read_excel,
+# "stream" reads it row by row with openpyxl in read-only mode.
+BACKENDS = ["pandas", "stream"]
+# Backend used when none is given, can be changed without touching the code
+DEFAULT_BACKEND = os.environ.get("TIMETABLE_BACKEND", "pandas")
+
+# Parsed frames by file path and modification stamp, shared by every consumer in this process
+_frame_cache = {}
+
+
+def read_timetables(file_paths):
+    """
+    Read each distinct timetable workbook once.
+
+    The same workbook may appear several times in file_paths (MA-TO is both the
+    first and the last day of the week), but it is parsed only on its first
+    occurrence. Later calls in the same process reuse the parsed frames unless the
+    workbook has been modified since.
+
+    Args:
+        file_paths (list): List of file paths to the Excel files.
+
+    Returns:
+        dict: File path to DataFrame with the Tunnus, Lähtöaika and Saapumisaika columns.
+    """
+    frames = {}
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if _frame_cache.get(file_path, (None,))[0] != stamp:
+            _frame_cache[file_path] = (stamp, pd.read_excel(file_path, sheet_name=0, usecols=TIMETABLE_COLUMNS))
+        frames[file_path] = _frame_cache[file_path][1]
+    return frames
+
+
+def to_minutes(column):
+    """
+    Convert a column of timetable times to minutes since the start of the service day.
+
+    Cells are time values or HH:MM:SS strings. Times past midnight, which the workbooks
+    store as durations such as "1 day, 0:26:00", become 24:26 i.e. 1466 minutes instead
+    of being dropped. Seconds are truncated.
+
+    Args:
+        column (Series): Timetable column, e.g. df["Lähtöaika"].
+
+    Returns:
+        Series: Minutes as Int32, unparseable values are <NA>.
+    """
+    durations = pd.to_timedelta(column.astype(str), errors="coerce")
+    return (durations // pd.Timedelta(minutes=1)).astype("Int32")
+
+
+def aggregate_day(df, prefixes):
+    """
+    Clean one day's timetable and group it by Tunnus.
+
+    Args:
+        df (DataFrame): Timetable with the Tunnus, Lähtöaika and Saapumisaika columns.
+        prefixes (list): Bus type prefixes, rows whose Tunnus contains none of them are dropped.
+
+    Returns:
+        DataFrame: Tunnus, smallest_departure and largest_arrival per bus, times in minutes.
+            A bus without any parseable departure or arrival has <NA> in that column.
+    """
+    df = df.dropna(subset=["Tunnus"])
+    df = df[df["Tunnus"].apply(lambda bus_id: any(prefix in bus_id for prefix in prefixes))].copy()
+    df["Tunnus"] = df["Tunnus"].str.strip()  # Poista ylimääräiset välilyönnit
+
+    df["Lähtöaika"] = to_minutes(df["Lähtöaika"])
+    df["Saapumisaika"] = to_minutes(df["Saapumisaika"])
+
+    return df.groupby("Tunnus").agg(
+        smallest_departure=("Lähtöaika", "min"),
+        largest_arrival=("Saapumisaika", "max")
+    ).reset_index()
+
+
+def cache_key(file_path, prefixes):
+    """Hash of the workbook content, the bus type prefixes and the cache version."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(",".join(sorted(prefixes)).encode("utf-8"))
+    digest.update(str(CACHE_VERSION).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def table_to_arrays(table):
+    """Compact numpy form of a day table, missing times as -1."""
+    return {
+        "bus_ids": table["Tunnus"].to_numpy(dtype=str),
+        "departures": table["smallest_departure"].to_numpy(dtype=np.int32, na_value=-1),
+        "arrivals": table["largest_arrival"].to_numpy(dtype=np.int32, na_value=-1),
+    }
+
+
+def arrays_to_table(arrays):
+    """Day table from the arrays returned by table_to_arrays."""
+    return pd.DataFrame({
+        "Tunnus": arrays["bus_ids"].astype(object),
+        "smallest_departure": pd.arrays.IntegerArray(arrays["departures"], arrays["departures"] < 0),
+        "largest_arrival": pd.arrays.IntegerArray(arrays["arrivals"], arrays["arrivals"] < 0),
+    })
+
+
+def cell_minutes(value):
+    """Minutes since the start of the service day of one timetable cell, like to_minutes. None if unparseable."""
+    if isinstance(value, datetime.time):
+        return value.hour * 60 + value.minute
+    if isinstance(value, datetime.timedelta):
+        return int(value // datetime.timedelta(minutes=1))
+    if isinstance(value, str):
+        try:
+            return int(pd.Timedelta(value) // pd.Timedelta(minutes=1))
+        except ValueError:
+            return None
+    return None
+
+
+def stream_day(file_path, prefixes):
+    """
+    Aggregate one workbook row by row without loading the sheet into memory.
+
+    Gives the same result as aggregate_day on the frame read by read_timetables, but
+    keeps only the running smallest departure and largest arrival of each bus, so
+    memory use depends on the number of buses instead of the number of rows.
+
+    Args:
+        file_path (str): Path to the Excel file.
+        prefixes (list): Bus type prefixes, rows whose Tunnus contains none of them are dropped.
+
+    Returns:
+        dict: Arrays in the form returned by table_to_arrays.
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows))
+        id_col, departure_col, arrival_col = (header.index(column) for column in TIMETABLE_COLUMNS)
+
+        busses = {}  # Tunnus -> [smallest departure, largest arrival]
+        for row in rows:
+            bus_id = row[id_col] if id_col < len(row) else None
+            if not isinstance(bus_id, str) or not any(prefix in bus_id for prefix in prefixes):
+                continue
+            times = busses.setdefault(bus_id.strip(), [None, None])
+
+            departure = cell_minutes(row[departure_col]) if departure_col < len(row) else None
+            if departure is not None and (times[0] is None or departure < times[0]):
+                times[0] = departure
+
+            arrival = cell_minutes(row[arrival_col]) if arrival_col < len(row) else None
+            if arrival is not None and (times[1] is None or arrival > times[1]):
+                times[1] = arrival
+    finally:
+        workbook.close()
+
+    bus_ids = sorted(busses)
+    return {
+        "bus_ids": np.array(bus_ids, dtype=str),
+        "departures": np.array([-1 if busses[b][0] is None else busses[b][0] for b in bus_ids], dtype=np.int32),
+        "arrivals": np.array([-1 if busses[b][1] is None else busses[b][1] for b in bus_ids], dtype=np.int32),
+    }
+
+
+def parse_day(file_path, prefixes, backend="pandas"):
+    """Read and aggregate one workbook with the given backend, returning compact arrays. Runs in a worker process."""
+    if backend == "stream":
+        return stream_day(file_path, prefixes)
+    if backend == "pandas":
+        return table_to_arrays(aggregate_day(read_timetables([file_path])[file_path], prefixes))
+    raise ValueError(f"Unknown timetable backend {backend!r}, expected one of {BACKENDS}")
+
+
+def save_day_table(path, arrays):
+    """Store the arrays of a day table as an uncompressed .npz file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)  # Never leave a half-written file behind
+
+
+def load_day_table(path):
+    """Load the arrays of a day table stored by save_day_table."""
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def parse_days(file_paths, prefixes, workers=None, backend="pandas"):
+    """
+    Parse several workbooks, each in its own worker process.
+
+    Args:
+        file_paths (list): Distinct file paths to the Excel files.
+        prefixes (list): Bus type prefixes.
+        workers (int): Maximum number of worker processes, default one per workbook
+            up to the number of CPUs. With one workbook or workers=1 everything is
+            parsed in this process.
+        backend (str): Workbook reader, one of BACKENDS.
+
+    Returns:
+        dict: File path to the arrays returned by parse_day.
+    """
+    if workers is None:
+        workers = min(len(file_paths), os.cpu_count() or 1)
+    if workers <= 1 or len(file_paths) <= 1:
+        return {file_path: parse_day(file_path, prefixes, backend) for file_path in file_paths}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {file_path: pool.submit(parse_day, file_path, prefixes, backend) for file_path in file_paths}
+        return {file_path: future.result() for file_path, future in futures.items()}
+
+
+def load_day_tables(file_paths, prefixes, use_cache=True, workers=None, backend=None):
+    """
+    Return the grouped day table of each workbook, parsing only workbooks that are not cached.
+
+    Cached tables are keyed by the workbook content and the prefix set, so an edited
+    workbook or a changed BUS_TYPE_MAPPING is parsed again automatically. Workbooks
+    that have to be parsed are handled in parallel worker processes.
+
+    Args:
+        file_paths (list): List of file paths to the Excel files.
+        prefixes (iterable): Bus type prefixes, e.g. BUS_TYPE_MAPPING.keys().
+        use_cache (bool): Read and write the on-disk cache in CACHE_DIR.
+        workers (int): Maximum number of worker processes, see parse_days.
+        backend (str): Workbook reader, one of BACKENDS. Defaults to DEFAULT_BACKEND,
+            which is read from the TIMETABLE_BACKEND environment variable.
+
+    Returns:
+        dict: File path to the DataFrame returned by aggregate_day.
+    """
+    prefixes = list(prefixes)
+    backend = backend or DEFAULT_BACKEND
+    arrays = {}
+    cache_paths = {}
+    for file_path in dict.fromkeys(file_paths):
+        if use_cache:
+            cache_paths[file_path] = os.path.join(CACHE_DIR, cache_key(file_path, prefixes) + ".npz")
+            if os.path.exists(cache_paths[file_path]):
+                arrays[file_path] = load_day_table(cache_paths[file_path])
+
+    missing = [file_path for file_path in dict.fromkeys(file_paths) if file_path not in arrays]
+    for file_path, parsed in parse_days(missing, prefixes, workers, backend).items():
+        arrays[file_path] = parsed
+        if use_cache:
+            save_day_table(cache_paths[file_path], parsed)
+
+    return {file_path: arrays_to_table(arrays[file_path]) for file_path in dict.fromkeys(file_paths)}
+
+
+# Columns of WeekTimetable.times. Night k (see NIGHTS) arrives in column 2k and departs in column 2k + 1.
+TIME_COLUMNS = [
+    "arrival_time_MAKE", "departure_time_TITO",
+    "arrival_time_TO", "departure_time_PE",
+    "arrival_time_PE", "departure_time_LA",
+    "arrival_time_LA", "departure_time_SU",
+    "arrival_time_SU", "departure_time_MA",
+]
+NIGHTS = ["make", "to", "pe", "la", "su"]
+
+
+def week_steps(day_tables, file_paths):
+    """
+    How the week is filled from the day tables, in order.
+
+    Returns:
+        list: Tuples (file path, day table, day table column, week columns).
+    """
+    first = day_tables[file_paths[0]].dropna(subset=["smallest_departure", "largest_arrival"])
+    steps = [
+        (file_paths[0], first, "largest_arrival", ["arrival_time_MAKE"]),
+        (file_paths[0], first, "smallest_departure", ["departure_time_TITO", "departure_time_MA"]),
+    ]
+    arrival_columns = ["arrival_time_TO", "arrival_time_PE", "arrival_time_LA", "arrival_time_SU"]
+    departure_columns = [["departure_time_PE"], ["departure_time_LA"], ["departure_time_SU"], []]
+    for i in range(len(file_paths) - 1):
+        steps.append((file_paths[i], day_tables[file_paths[i]], "largest_arrival", [arrival_columns[i]]))
+        steps.append((file_paths[i + 1], day_tables[file_paths[i + 1]], "smallest_departure", departure_columns[i]))
+    return steps
+
+
+def week_bus_ids(steps):
+    """Bus IDs of the week in the order they first appear in the steps."""
+    return pd.unique(np.concatenate([table["Tunnus"].to_numpy(dtype=str) for _, table, _, _ in steps]))
+
+
+class WeekTimetable:
+    """
+    Arrival and departure times of every bus for one week, stored column-wise.
+
+    Attributes:
+        bus_ids (ndarray): Bus ID of each row, e.g. "DMV429".
+        types (list): Bus type prefixes, type code k stands for types[k].
+        type_codes (ndarray): int8 type code of each row.
+        times (ndarray): (n_buses x 10) int32 minutes, columns as in TIME_COLUMNS.
+        missing (ndarray): (n_buses x 10) bool, True where the bus has no time.
+    """
+    def __init__(self, bus_ids, types, times, missing):
+        self.bus_ids = np.asarray(bus_ids, dtype=str)
+        self.types = list(types)
+        type_index = {t: k for k, t in enumerate(self.types)}
+        self.type_codes = np.array([type_index[bus_id[:3]] for bus_id in self.bus_ids], dtype=np.int8)
+        self.times = np.asarray(times, dtype=np.int32).reshape(len(self.bus_ids), len(TIME_COLUMNS))
+        self.missing = np.asarray(missing, dtype=bool).reshape(self.times.shape)
+        self.index = {bus_id: row for row, bus_id in enumerate(self.bus_ids)}
+
+    @classmethod
+    def from_day_tables(cls, day_tables, file_paths, types):
+        """
+        Build the week from the day tables returned by load_day_tables.
+
+        The first workbook gives the Monday evening arrivals and the Tuesday and Monday
+        departures of the buses that have both. Workbook i then gives the arrivals of
+        night i and workbook i + 1 the departures that follow it. Rows are in the order
+        in which the buses first appear.
+
+        Args:
+            day_tables (dict): File path to day table.
+            file_paths (list): The five workbooks of the week, MA-TO first and last.
+            types (iterable): Bus type prefixes, e.g. BUS_TYPE_MAPPING.keys().
+        """
+        steps = week_steps(day_tables, file_paths)
+        bus_ids = week_bus_ids(steps)
+        times = np.zeros((len(bus_ids), len(TIME_COLUMNS)), dtype=np.int32)
+        missing = np.ones((len(bus_ids), len(TIME_COLUMNS)), dtype=bool)
+
+        week = cls(bus_ids, types, times, missing)
+        week.update_columns(steps)
+        return week
+
+    @classmethod
+    def load(cls, path):
+        """Load a week stored by save. Returns the week and the source keys given to save."""
+        with np.load(path, allow_pickle=False) as data:
+            week = cls(data["bus_ids"], data["types"].tolist(), data["times"], data["missing"])
+            keys = dict(zip(data["paths"].tolist(), data["keys"].tolist()))
+        return week, keys
+
+    def save(self, path, keys):
+        """
+        Store the week as an uncompressed .npz file.
+
+        Args:
+            path (str): Path of the .npz file.
+            keys (dict): File path to the cache_key of the workbook the week was built from.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            bus_ids=self.bus_ids,
+            types=np.array(self.types, dtype=str),
+            times=self.times,
+            missing=self.missing,
+            paths=np.array(list(keys), dtype=str),
+            keys=np.array(list(keys.values()), dtype=str),
+        )
+        os.replace(tmp_path, path)
+
+    def update_columns(self, steps):
+        """
+        Overwrite the week columns of the given steps (see week_steps) with their day tables.
+
+        Buses that are not in a step's day table get a missing time in its columns.
+        Every bus of the day tables must already have a row.
+        """
+        rows = pd.Index(self.bus_ids)
+        for _, table, source, columns in steps:
+            cols = [TIME_COLUMNS.index(column) for column in columns]
+            indexer = rows.get_indexer(table["Tunnus"])
+            values = table[source].to_numpy(dtype=np.int32, na_value=0)
+            absent = table[source].isna().to_numpy()
+
+            self.missing[:, cols] = True
+            for col in cols:
+                self.times[indexer, col] = values
+                self.missing[indexer, col] = absent
+
+    def __len__(self):
+        return len(self.bus_ids)
+
+    def select(self, rows):
+        """Return a new WeekTimetable with only the given rows (index array or boolean mask)."""
+        return WeekTimetable(self.bus_ids[rows], self.types, self.times[rows], self.missing[rows])
+
+    def time(self, bus_id, column):
+        """Return the time of a bus in minutes, or None."""
+        row, col = self.index[bus_id], TIME_COLUMNS.index(column)
+        return None if self.missing[row, col] else int(self.times[row, col])
+
+    def set_times(self, rows, column, values):
+        """Set the times of the given rows in one column."""
+        col = TIME_COLUMNS.index(column)
+        self.times[rows, col] = values
+        self.missing[rows, col] = False
+
+    def fill_missing(self, value):
+        """Replace every missing time with value."""
+        self.times[self.missing] = value
+        self.missing[:] = False
+
+    def has_times(self, *columns):
+        """Boolean mask of the rows that have a time in every given column."""
+        cols = [TIME_COLUMNS.index(column) for column in columns]
+        return ~self.missing[:, cols].any(axis=1)
+
+    def starts_with(self, prefixes, rows=None):
+        """Boolean mask over rows (default all) of the buses whose ID starts with one of the prefixes."""
+        bus_ids = self.bus_ids if rows is None else self.bus_ids[rows]
+        mask = np.zeros(len(bus_ids), dtype=bool)
+        for prefix in prefixes:
+            mask |= np.char.startswith(bus_ids, prefix)
+        return mask
+
+    def rename_type(self, old, new):
+        """Change the type prefix of every bus of type old to new, e.g. SVV703 -> SMV703."""
+        rows = self.starts_with([old])
+        bus_ids = self.bus_ids.astype(object)
+        bus_ids[rows] = [new + bus_id[len(old):] for bus_id in bus_ids[rows]]
+        self.bus_ids = bus_ids.astype(str)
+        self.type_codes[rows] = self.types.index(new)
+        self.index = {bus_id: row for row, bus_id in enumerate(self.bus_ids)}
+
+    def order(self, column, rows=None):
+        """
+        Return rows (default all) sorted by their time in column, ties in row order.
+
+        Raises:
+            ValueError: If one of the rows has no time in column.
+        """
+        col = TIME_COLUMNS.index(column)
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows)
+        if self.missing[rows, col].any():
+            raise ValueError(f"Buses without {column}: {list(self.bus_ids[rows[self.missing[rows, col]]])}")
+        return rows[np.argsort(self.times[rows, col], kind="stable")]
+
+    def type_names(self, rows):
+        """Bus type prefix of each of the given rows."""
+        return [self.types[code] for code in self.type_codes[rows]]
+
+    def describe(self, row):
+        """Readable summary of one bus, None for missing times."""
+        times = ", ".join(
+            f"{column}={None if self.missing[row, col] else int(self.times[row, col])}"
+            for col, column in enumerate(TIME_COLUMNS)
+        )
+        return f"Bus(ID={self.bus_ids[row]}, {times})"
+
+
+def load_week(file_paths, types, backend=None, workers=None):
+    """
+    Return the WeekTimetable of the workbooks, re-parsing only the workbooks that changed.
+
+    The last week built from the same file paths and types is kept in CACHE_DIR together
+    with the content keys of its workbooks. If a workbook has changed since, only that
+    workbook is parsed again and only the week columns that come from it are rewritten.
+    When the set of buses changes the week is rebuilt from the day tables, which are
+    still read from the cache for unchanged workbooks.
+
+    Args:
+        file_paths (list): The five workbooks of the week, MA-TO first and last.
+        types (iterable): Bus type prefixes, e.g. BUS_TYPE_MAPPING.keys().
+        backend (str): Workbook reader, see load_day_tables.
+        workers (int): Maximum number of worker processes, see parse_days.
+
+    Returns:
+        WeekTimetable: The week, see WeekTimetable.from_day_tables.
+    """
+    types = list(types)
+    keys = {file_path: cache_key(file_path, types) for file_path in file_paths}
+
+    digest = hashlib.sha256("\n".join(list(file_paths) + types + [str(CACHE_VERSION)]).encode("utf-8"))
+    path = os.path.join(CACHE_DIR, "week-" + digest.hexdigest() + ".npz")
+
+    week, changed = None, set(keys)
+    if os.path.exists(path):
+        week, old_keys = WeekTimetable.load(path)
+        changed = {file_path for file_path in keys if old_keys.get(file_path) != keys[file_path]}
+        if not changed:
+            return week
+
+    day_tables = load_day_tables(file_paths, types, backend=backend, workers=workers)
+    steps = week_steps(day_tables, file_paths)
+    if week is not None and np.array_equal(week_bus_ids(steps), week.bus_ids):
+        print(f"Updating week columns from {sorted(changed)}")
+        week.update_columns([step for step in steps if step[0] in changed])
+    else:
+        week = WeekTimetable.from_day_tables(day_tables, file_paths, types)
+
+    week.save(path, keys)
+    return week
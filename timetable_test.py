@@ -0,0 +1,137 @@
+import contextlib
+import datetime
+import io
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import openpyxl
+
+import timetable
+from MAKE import BUS_TYPE_MAPPING
+
+
+# Regression check of the incremental re-ingest in timetable.load_week: after editing one day
+# workbook, the week patched from the cache must equal a week built from scratch.
+# Usage: python timetable_test.py (also runs under pytest)
+
+WEEK = ["KAJSYK24_MA-TO.xlsx", "KAJSYK24_PE.xlsx", "KAJSYK24_LA.xlsx", "KAJSYK24_SU.xlsx", "KAJSYK24_MA-TO.xlsx"]
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+EDITED = "KAJSYK24_SU.xlsx"
+
+
+def rebuilt_week(file_paths, types):
+    """The week built from scratch, without any cache."""
+    day_tables = timetable.load_day_tables(file_paths, types, use_cache=False)
+    return timetable.WeekTimetable.from_day_tables(day_tables, file_paths, types)
+
+
+def assert_same_week(week, expected):
+    assert week.bus_ids.tolist() == expected.bus_ids.tolist()
+    assert week.types == expected.types
+    assert np.array_equal(week.type_codes, expected.type_codes)
+    assert np.array_equal(week.missing, expected.missing)
+    assert np.array_equal(week.times[~week.missing], expected.times[~expected.missing])
+
+
+def edit_sheet(path, edit):
+    """Apply edit(sheet, header) to the first sheet of the workbook and save it."""
+    workbook = openpyxl.load_workbook(path)
+    sheet = workbook.worksheets[0]
+    header = [cell.value for cell in sheet[1]]
+    edit(sheet, header)
+    workbook.save(path)
+
+
+def bus_rows(sheet, header, bus_id):
+    """Sheet row numbers of one bus."""
+    column = header.index("Tunnus")
+    return [row[0].row for row in sheet.iter_rows(min_row=2) if row[column].value == bus_id]
+
+
+def shift_last_arrival(bus_id, minutes):
+    """Edit: move the last arrival of a bus by minutes, a time change with the same buses."""
+    def edit(sheet, header):
+        cells = [sheet.cell(row, header.index("Saapumisaika") + 1) for row in bus_rows(sheet, header, bus_id)]
+        cell = max((cell for cell in cells if isinstance(cell.value, datetime.time)), key=lambda cell: cell.value)
+        moment = datetime.datetime.combine(datetime.date.today(), cell.value) + datetime.timedelta(minutes=minutes)
+        cell.value = moment.time()
+    return edit
+
+
+def remove_bus(bus_id):
+    """Edit: delete every row of a bus, which then disappears from this workbook only."""
+    def edit(sheet, header):
+        for row in reversed(bus_rows(sheet, header, bus_id)):
+            sheet.delete_rows(row)
+    return edit
+
+
+def add_bus(bus_id, copy_of):
+    """Edit: add a new bus with the rows of another one, which changes the buses of the week."""
+    def edit(sheet, header):
+        column = header.index("Tunnus")
+        for row in bus_rows(sheet, header, copy_of):
+            values = [cell.value for cell in sheet[row]]
+            values[column] = bus_id
+            sheet.append(values)
+    return edit
+
+
+def check_edit(edit, in_place):
+    """
+    Load the week, edit one workbook and compare the reloaded week with one built from scratch.
+    in_place tells whether the edit keeps the buses of the week, so that load_week patches the
+    cached week instead of rebuilding it.
+    """
+    types = list(BUS_TYPE_MAPPING.keys())
+    with tempfile.TemporaryDirectory() as tmp:
+        saved_cache_dir = timetable.CACHE_DIR
+        timetable.CACHE_DIR = os.path.join(tmp, "cache")
+        try:
+            for name in dict.fromkeys(WEEK):
+                shutil.copy(os.path.join(DATA_DIR, name), tmp)
+            file_paths = [os.path.join(tmp, name) for name in WEEK]
+
+            before = timetable.load_week(file_paths, types)
+            assert_same_week(before, rebuilt_week(file_paths, types))
+            edit_sheet(os.path.join(tmp, EDITED), edit)
+
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                week = timetable.load_week(file_paths, types)
+            assert ("Updating week columns" in output.getvalue()) == in_place
+            assert not (np.array_equal(week.missing, before.missing) and np.array_equal(week.times, before.times)
+                        and week.bus_ids.tolist() == before.bus_ids.tolist()), "The edit did not change the week"
+            assert_same_week(week, rebuilt_week(file_paths, types))
+        finally:
+            timetable.CACHE_DIR = saved_cache_dir
+
+
+def su_bus():
+    """A bus of the SU workbook that is also in the other workbooks of the week."""
+    types = list(BUS_TYPE_MAPPING.keys())
+    file_paths = [os.path.join(DATA_DIR, name) for name in WEEK]
+    day_tables = timetable.load_day_tables(file_paths, types, use_cache=False)
+    su = set(day_tables[os.path.join(DATA_DIR, EDITED)]["Tunnus"])
+    others = set().union(*(set(table["Tunnus"]) for path, table in day_tables.items() if not path.endswith(EDITED)))
+    return sorted(su & others)[0]
+
+
+def test_changed_time():
+    check_edit(shift_last_arrival(su_bus(), 7), in_place=True)
+
+
+def test_bus_disappears_from_one_workbook():
+    check_edit(remove_bus(su_bus()), in_place=True)
+
+
+def test_new_bus():
+    check_edit(add_bus(su_bus()[:3] + "999", su_bus()), in_place=False)
+
+
+if __name__ == "__main__":
+    for test in (test_changed_time, test_bus_disappears_from_one_workbook, test_new_bus):
+        test()
+        print(f"{test.__name__}: ok")